@@ -1,9 +1,21 @@
 import os
+import hashlib
+import io
+import sys
+import concurrent.futures
+import mmap
 import pickle
+import threading
+import struct
 import pygame
 import random
 import math
 
+try:
+    import numpy
+except ImportError:
+    numpy = None    # Optional, only used by ElementStore
+
 DARK_RED = (139, 0, 0)
 YELLOW = (235, 195, 65)
 BLACK = (0, 0, 0)
@@ -21,6 +33,43 @@ PURPLE = (181, 60, 177)
 BROWN = (150, 75, 0)
 DARK_GREY = (52, 52, 52)
 
+# Keys kept in replays, the position of a key is its bit in the replay masks
+REPLAY_KEYS = [pygame.K_a, pygame.K_d, pygame.K_w, pygame.K_UP, pygame.K_SPACE,
+               pygame.K_ESCAPE, pygame.K_q, pygame.K_r, pygame.K_b]
+REPLAY_HEADER = "<4sBHiHH"    # Magic, version, tick rate, level id, width, height
+
+# Binary level files, see LevelFile
+LEVEL_FILE = "save_all.pscl"
+LEVEL_HEADER = "<4sHH"    # Magic, version, number of sections
+LEVEL_SECTION = "<16sBII"    # Save name, record type, offset in the file, record count
+LEVEL_RECTS, LEVEL_INTS, LEVEL_KIND_INTS, LEVEL_INT = 0, 1, 2, 3    # Record types
+LEVEL_RECORDS = {LEVEL_RECTS: "<iiii",    # x, y, width, height
+                 LEVEL_INTS: "<i",
+                 LEVEL_KIND_INTS: "<ii",    # Element type, value
+                 LEVEL_INT: "<i"}
+# Record type of each pickle file a level is saved as
+LEVEL_SECTIONS = {"save_plat": LEVEL_RECTS, "save_win": LEVEL_RECTS, "save_death": LEVEL_RECTS,
+                  "save_respawn": LEVEL_RECTS, "save_decor": LEVEL_RECTS,
+                  "save_asset": LEVEL_KIND_INTS, "save_asset_id": LEVEL_KIND_INTS,
+                  "save_bg": LEVEL_INT, "save_level": LEVEL_INTS}
+# Save name of each element type, in element dictionary order
+ELEMENT_SAVES = ["save_plat", "save_win", "save_death", "save_respawn", "save_decor"]
+# Levels split into regions for streaming, see LevelFile.split_regions
+REGION_FOLDER = "regions/"
+REGION_MANIFEST = "region_manifest"
+
+SFX_FOLDER = "game_files/psC_sfx"    # Sound effects, see SoundBank
+
+# Decoded images kept on disk, see PixelCache
+PIXEL_CACHE_FOLDER = "game_files/psC_cache/"
+PIXEL_HEADER = "<4sHHHHI"    # Magic, width, height, frame width, frame height, frame count
+PIXEL_FRAME = "<HHHH"    # x, y, width, height of one frame
+# Pixel byte order for pygame.image.tobytes/frombuffer by the display's (red, green, blue, alpha) masks
+ASSET_FOLDERS = ["game_files/psC_imgs", "game_files/psC_ani", "game_files/psC_bg"]    # Decoded by AssetLoader
+PIXEL_FORMATS = {(0xff, 0xff00, 0xff0000, 0xff000000): "RGBA",
+                 (0xff0000, 0xff00, 0xff, 0xff000000): "BGRA",
+                 (0xff00, 0xff0000, 0xff000000, 0xff): "ARGB"}
+
 
 class Text:
     """
@@ -82,6 +131,12 @@ class Music:
     """
     Music class containing tracks available and the current music playing.
     Also responsible for music volume and music switching.
+
+    Track files are read into memory on a background thread (preload), so
+    loading a track only has to open the bytes already read. Fades move
+    with the time passed every time tick is called, call it once per frame
+    or step. The mixer plays one music stream at a time, so crossfade fades
+    the current track out and then the next one in.
     """
 
     def __init__(self, perc_vol):
@@ -93,6 +148,7 @@ class Music:
         self.file_path = "put_file_path_for_music"  # File path for audio
 
         self.current_track_index = 0  # Everything but the main menu theme
+        self.next_track_index = None  # Track switch_music plays next, read ahead of time
 
         self.perc_vol = perc_vol  # Volume set by the player as a percentage
         self.music_vol = 0  # Adjustable music volume
@@ -100,6 +156,17 @@ class Music:
         self.max_vol = 1 * self.perc_vol / 100  # Max volume possible for music
         # Change 1 value for changing music
 
+        self.reader = concurrent.futures.ThreadPoolExecutor(max_workers=1)  # Reads track files
+        self.track_data = {}  # Track index -> Future of the bytes of its file
+
+        self.fading = False  # If tick is moving the volume
+        self.fade_from = 0  # Volume when the fade started
+        self.fade_to = 0  # Volume when the fade ends
+        self.fade_start = 0  # Timestamp the fade started
+        self.fade_ms = 0  # Length of the fade
+        self.pending_track = None  # (track index, loops, fade in ms) started when the fade out ends
+        self.queue = []  # (track index, loops) played in order after the current track ends
+
         """pygame.mixer.music.load(self.file_path + self.music_tracks[0])"""
         #   Load this music up upon loading
 
@@ -109,25 +176,51 @@ class Music:
         self.text_timer = pygame.time.get_ticks()
         # Display what's currently playing
 
+    def preload(self, track_num):
+        # Start reading a track file on the reader thread, if it isn't read yet
+        if track_num not in self.track_data:
+            self.track_data[track_num] = self.reader.submit(self.read_track, track_num)
+
+    def read_track(self, track_num):
+        # Runs on the reader thread
+        with open(self.file_path + self.music_tracks[track_num], "rb") as track_file:
+            return track_file.read()
+
+    def track_ready(self, track_num):
+        return track_num in self.track_data and self.track_data[track_num].done()
+
+    def load_track(self, track_num):
+        # Load a track into the mixer, from memory if it was read already
+        if self.track_ready(track_num):
+            pygame.mixer.music.load(io.BytesIO(self.track_data[track_num].result()),
+                                    os.path.splitext(self.music_tracks[track_num])[1][1:])
+        else:
+            pygame.mixer.music.load(self.file_path + self.music_tracks[track_num])
+
     def switch_music(self):
         # Reset music display timer
         self.text_timer = pygame.time.get_ticks()
 
-        # Choose a random track index
+        # Choose a random track index, unless the next one was chosen already
         self.music_vol = 0
         self.current_track_index = random.randint(1, len(self.music_tracks) - 2)
         # Set the boundaries between 2nd/1 and 2nd last/len - 2 to avoid
         # main menu and credits
+        if self.next_track_index is not None:
+            self.current_track_index = self.next_track_index
 
         # Load the selected track
-        pygame.mixer.music.load(self.file_path +
-                                (self.music_tracks[self.current_track_index]))
+        self.load_track(self.current_track_index)
 
         # Set the volume
         pygame.mixer.music.set_volume(self.music_vol)
 
         pygame.mixer.music.play(0, 0, 0)  # Play the music once
 
+        # Choose the track after this one now, so it's read while this one plays
+        self.next_track_index = random.randint(1, len(self.music_tracks) - 2)
+        self.preload(self.next_track_index)
+
     def set_music(self, track_num, vol, loops, start, fade_in):
         # Set the max volume
         self.max_vol = 0.7 * self.perc_vol / 100
@@ -139,8 +232,7 @@ class Music:
         self.current_track_index = track_num
 
         # Load the selected track
-        pygame.mixer.music.load(self.file_path +
-                                (self.music_tracks[self.current_track_index]))
+        self.load_track(self.current_track_index)
 
         # Set the volume
         self.music_vol = vol * self.perc_vol / 100
@@ -153,20 +245,162 @@ class Music:
         # until volume reaches the max (0.7 or self.max_vol)
         # set the new self.max_vol if changed
         self.max_vol = 0.7 * self.perc_vol / 100
-        while self.music_vol < self.max_vol and \
-                75 < pygame.time.get_ticks() - self.vol_time:
-            self.music_vol += 0.01  # Increase volume
-            pygame.mixer.music.set_volume(self.music_vol)  # Update volume
-            self.vol_time = pygame.time.get_ticks()  # Reset timer
+        if self.music_vol < self.max_vol and not self.fading:
+            self.start_fade(self.max_vol, (self.max_vol - self.music_vol) / 0.01 * 75)
+        self.tick()
+
+    def start_fade(self, volume, fade_ms, now=None):
+        """ Move the volume from where it is to volume over fade_ms, as tick is called"""
+        if now is None:
+            now = pygame.time.get_ticks()
+        self.fading = True
+        self.fade_from = self.music_vol
+        self.fade_to = volume
+        self.fade_start = now
+        self.fade_ms = fade_ms
+
+    def crossfade(self, track_num, fade_ms=1000, loops=0):
+        """ Fade the current track out and track_num in, fade_ms for both
+        fades together. Queued tracks still play after track_num"""
+        self.preload(track_num)
+        self.pending_track = (track_num, loops, fade_ms / 2)
+        self.start_fade(0, fade_ms / 2 if pygame.mixer.music.get_busy() else 0)
+
+    def enqueue(self, track_num, loops=0):
+        """ Play track_num after the current track (and the ones queued before it) ends"""
+        self.preload(track_num)
+        self.queue += [(track_num, loops)]
+
+    def tick(self, now=None):
+        """ Move the fade along by the time passed, and start the next
+        track when a fade out is done or the current track ended"""
+        if now is None:
+            now = pygame.time.get_ticks()
+        if self.fading:
+            fade_done = 1
+            if 0 < self.fade_ms:
+                fade_done = min(1, (now - self.fade_start) / self.fade_ms)
+            self.music_vol = self.fade_from + (self.fade_to - self.fade_from) * fade_done
+            pygame.mixer.music.set_volume(self.music_vol)
+            self.fading = fade_done < 1
+
+        if self.pending_track is None and 0 < len(self.queue) and not pygame.mixer.music.get_busy():
+            # The current track ended, start the next one at full volume
+            self.pending_track = self.queue.pop(0) + (0,)
+        if self.pending_track is not None and not self.fading and \
+                self.track_ready(self.pending_track[0]):
+            # Wait for the file to be read instead of reading it here
+            track_num, loops, fade_in = self.pending_track
+            self.pending_track = None
+            self.text_timer = now
+            self.current_track_index = track_num
+            self.load_track(track_num)
+            self.music_vol = 0
+            pygame.mixer.music.set_volume(self.music_vol)
+            pygame.mixer.music.play(loops)
+            self.start_fade(self.max_vol, fade_in, now)
+
+
+class SoundBank:
+    """
+    Sound effects loaded once per run, played on a fixed pool of reserved mixer channels.
+        Sound file names follow this naming convention: NAME_PRIORITY_INTERVAL_VOLUME
+        NAME is what play is called with, INTERVAL is the least time in ms between two plays of
+        the sound (more often than that is skipped) and VOLUME is a percentage.
+        When every channel is busy, a sound takes the channel playing the lowest priority sound
+        that isn't higher than its own, or is dropped. play doesn't make any new objects, so it's
+        cheap to call from input. Use SFX_BANK, it plays nothing if the mixer isn't initialized.
+    """
+
+    def __init__(self, pool_size=8):
+        self.pool_size = pool_size    # Channels reserved for sound effects
+        self.sounds = {}    # Name -> [Sound, priority, interval, last played timestamp]
+        self.channels = []    # The reserved channels, made with the first load
+        self.channel_priority = []    # Priority of the sound last played on each channel
+        self.channel_time = []    # Timestamp each channel was last played
+        self.loaded_paths = []    # Folders loaded already
+
+    def load(self, in_path=SFX_FOLDER):
+        """ Load every sound in in_path, once per run"""
+        if in_path in self.loaded_paths or not pygame.mixer.get_init():
+            return None
+        self.loaded_paths += [in_path]
+        if len(self.channels) < 1:
+            pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), self.pool_size))
+            pygame.mixer.set_reserved(self.pool_size)    # Sound.play elsewhere won't take these
+            self.channels = [pygame.mixer.Channel(channel_id) for channel_id in range(self.pool_size)]
+            self.channel_priority = [0] * self.pool_size
+            self.channel_time = [0] * self.pool_size
+        if not os.path.isdir(in_path):
+            return None
+        for each_sound in os.listdir(in_path):
+            in_sfx = each_sound.split("_")
+            sound = pygame.mixer.Sound(in_path + "/" + each_sound)
+            sound.set_volume(int(in_sfx[3].split(".")[0]) / 100)
+            self.sounds[in_sfx[0]] = [sound, int(in_sfx[1]), int(in_sfx[2]), None]
+
+    def play(self, name, now=None):
+        """ Play the sound called name, unless it was played less than its interval before now
+        or every channel is playing something more important. Returns if it was played.
+        now defaults to pygame.time.get_ticks. The bank outlives every scene, so it needs a clock
+        that never restarts, not a scene's sim_time (that starts over with every level or life)"""
+        if name not in self.sounds:
+            return False
+        if now is None:
+            now = pygame.time.get_ticks()
+        sound_info = self.sounds[name]
+        if sound_info[3] is not None and now - sound_info[3] < sound_info[2]:
+            return False    # Played too recently
+
+        # A free channel, or else the oldest one playing the lowest priority
+        pick = -1
+        for channel_id in range(self.pool_size):
+            if not self.channels[channel_id].get_busy():
+                pick = channel_id
+                break
+            if self.channel_priority[channel_id] <= sound_info[1] and \
+                    (pick < 0 or self.channel_priority[channel_id] < self.channel_priority[pick] or
+                     (self.channel_priority[channel_id] == self.channel_priority[pick] and
+                      self.channel_time[channel_id] < self.channel_time[pick])):
+                pick = channel_id
+        if pick < 0:
+            return False    # Every channel has something more important
+
+        self.channels[pick].play(sound_info[0])
+        self.channel_priority[pick] = sound_info[1]
+        self.channel_time[pick] = now
+        sound_info[3] = now
+        return True
+
+
+SFX_BANK = SoundBank()    # Shared by every scene
 
 
 class Image:
     """
     Import images from a specific folder path ("game_files/psC_imgs" by default).
         See the Memory class for specific steps in file naming and to use the Image class.
+        If a TextureAtlas with the file packed is given, the image is taken from it instead.
+        Otherwise the file is decoded by ASSET_LOADER (ahead of time if it was preloaded),
+        which takes the decoded pixels from PIXEL_CACHE when it has them.
     """
-    def __init__(self, folder, asset_name, x, y, img_width, img_height, img_id):
-        self.img = pygame.image.load(folder + "/" + asset_name).convert_alpha()
+    def __init__(self, folder, asset_name, x, y, img_width, img_height, img_id, atlas=None):
+        self.img = None
+        self.folder = folder    # Where the file was loaded from, see reload
+        self.asset_name = asset_name
+        self.frame_table = None    # Areas of the frames for sprite sheets, see Animate
+        if atlas is not None:
+            self.img = atlas.get(folder, asset_name)
+        if self.img is None:
+            cache_key, self.img, frame_size, frame_table = ASSET_LOADER.take(folder, asset_name)
+            if pygame.display.get_surface() is not None:
+                # Match the display format for faster blits, skipped when running without a window
+                self.img = self.img.convert_alpha()
+            if frame_size == (img_width, img_height):
+                self.frame_table = frame_table
+            else:
+                # Not in the cache yet, or cached with another frame size
+                PIXEL_CACHE.save(cache_key, self.img, img_width, img_height)
         self.img_x = x
         self.img_y = y
         self.img_width = img_width
@@ -175,6 +409,13 @@ class Image:
 
         self.render_id = 0    # Type 0 visual for images
 
+    def reload(self):
+        # Decode the file again into this same object, so everything using it gets the new image
+        Image.__init__(self, self.folder, self.asset_name, self.img_x, self.img_y,
+                       self.img_width, self.img_height, self.img_id)
+        self.img_width = self.get_width()
+        self.img_height = self.get_height()
+
     def get_width(self):
         # Get width from image directly
         return self.img.get_width()
@@ -194,52 +435,67 @@ class Animate(Image):
         
         See the Memory class for specific steps in file naming and to use the Animate class.
     """
-    def __init__(self, file, asset_path, frame_delay, x, y, img_width, img_height, ani_id):
+    def __init__(self, file, asset_path, frame_delay, x, y, img_width, img_height, ani_id, atlas=None):
         Image.__init__(self, file, asset_path, x, y, img_width, img_height,
-                       ani_id)    # Initialize sprite sheet as an image
+                       ani_id, atlas)    # Initialize sprite sheet as an image
         
         self.img_rows = self.img.get_width() // self.img_width        # Total width / width of one image
         self.img_columns = self.img.get_height() // self.img_height    # Total height / height of one image
 
         self.img_frames = []    # Store animation frames as individual images
+        # The surface the frames are really in (an atlas page or the sheet itself) and their areas there
+        self.source = self.img.get_abs_parent()
+        self.frame_areas = []
 
         self.frame_delay = frame_delay    # Time to switch the frames
         self.frame_time = 0    # Timer for changing the frames
+        self.frame_now = None    # Timestamp the current frame was worked out for
 
         self.len = 0        # Amount of frames
 
         self.ani_id = ani_id   
         self.render_id = 1    # Type 1 visual for animations
 
-        for y in range(self.img_columns):
-            for x in range(self.img_rows):
-                # Get the rectangle area of one frame in the spritesheet
-                img_rect = pygame.Rect(x * self.img_width,
-                                       y * self.img_height,
-                                       self.img_width,
-                                       self.img_height)
-                img_rect.center = (self.img_x, self.img_y)
-
-                # Cut the image out using the rectangle dimensions and location
-                self.img.set_clip(pygame.Rect(x * self.img_width,
-                                              y * self.img_height,
-                                              self.img_width,
-                                              self.img_height))
-
-                # Add the rectangle to our set of frames
-                self.img_frames += [
-                    self.img.subsurface(self.img.get_clip())]
+        # Frame areas come from the pixel cache when the sheet was loaded from it
+        if self.frame_table is None:
+            self.frame_table = PixelCache.slice_frames(self.img.get_size(), self.img_width, self.img_height)
+        for frame_area in self.frame_table:
+            # Cut the frame out of the spritesheet and add it to our set of frames
+            self.img_frames += [self.img.subsurface(frame_area)]
+            self.frame_areas += [frame_area.move(self.img.get_abs_offset())]
 
-                # Get the length
-                self.len += 1
+            # Get the length
+            self.len += 1
 
         self.img_index = random.randint(0, self.len - 1)
 
-    def update_render(self):
-        # Change the frame if the time elapsed is greater than the set interval
-        if self.frame_delay < pygame.time.get_ticks() - self.frame_time:
+    def reload(self):
+        # Cut the frames out of the sprite sheet file again, staying on the same frame if it still exists
+        img_index = self.img_index
+        Animate.__init__(self, self.folder, self.asset_name, self.frame_delay, self.img_x, self.img_y,
+                         self.img_width, self.img_height, self.ani_id)
+        self.img_index = img_index % self.len
+
+    def update_render(self, now=None):
+        """ Change the frame if the time elapsed is greater than the set interval.
+        now is the timestamp shared by everything drawn in a frame, the frame is
+        only worked out once per timestamp however many elements use this animation"""
+        if now is None:
+            now = pygame.time.get_ticks()
+        elif now == self.frame_now:
+            return None    # Already up to date for this frame
+        self.frame_now = now
+        if self.frame_delay < now - self.frame_time:
             self.change_frame()       
-            self.frame_time = pygame.time.get_ticks()    # Reset timer
+            self.frame_time = now    # Reset timer
+
+    def due(self, now=None):
+        # Check if the next update_render will change the frame
+        if now is None:
+            now = pygame.time.get_ticks()
+        elif now == self.frame_now:
+            return False
+        return self.frame_delay < now - self.frame_time
 
     def change_frame(self):
         # Change the next frame to the next index, or the first index if at the last frame in self.img_frames
@@ -257,6 +513,7 @@ class Background(Animate):
     """
     Import a sprite sheet for a background from a specific folder path ("game_files/psC_bg" by default).
         This class adds onto Animate by having transparency, rendered first (put to the back), and parallax movement.
+        Frames are blended with their transparency over the fill color when loaded, so they are opaque.
     """
     def __init__(self, file, asset_path, frame_delay, transparency, pf, x, y, img_width, img_height, bg_id):
         Animate.__init__(self, file, asset_path, frame_delay, x, y, img_width, img_height, bg_id)
@@ -274,9 +531,38 @@ class Background(Animate):
         # How many in game units would it take to scroll the background with respect to player movement
         self.parallax_factor = pf
 
-    def set_transparency(self):
-        for each_frame in self.img_frames:
-            each_frame.set_alpha(self.transparency)
+    def reload(self):
+        # Load the sprite sheet file again, keeping the frame and parallax position
+        img_index = self.img_index
+        position = (self.parallax_x, self.x_offset, self.parallax_y, self.y_offset)
+        Background.__init__(self, self.folder, self.asset_name, self.frame_delay, self.transparency,
+                            self.parallax_factor, self.img_x, self.img_y, self.img_width, self.img_height,
+                            self.bg_id)
+        self.img_index = img_index % self.len
+        self.parallax_x, self.x_offset, self.parallax_y, self.y_offset = position
+
+    def set_transparency(self, fill_color=WHITE):
+        # Blend each frame over fill_color once here, instead of alpha blending every time it's drawn
+        for frame_index in range(len(self.img_frames)):
+            self.img_frames[frame_index].set_alpha(self.transparency)
+            blended = pygame.Surface(self.img_frames[frame_index].get_size())
+            blended.fill(fill_color)
+            blended.blit(self.img_frames[frame_index], (0, 0))
+            if pygame.display.get_surface() is not None:
+                blended = blended.convert()
+            self.img_frames[frame_index] = blended
+
+    def reset_position(self):
+        # Undo all parallax movement
+        self.parallax_x = 0
+        self.x_offset = 0
+        self.parallax_y = 0
+        self.y_offset = 0
+
+    def covers(self, area, pos):
+        # Check if the background drawn at pos (see render) hides everything in area
+        return pygame.Rect(pos[0] + self.x_offset, pos[1] + self.y_offset,
+                           self.img_width, self.img_height).contains(area)
 
     def bg_pos_x(self, move_x):
         self.parallax_x += move_x    # Add player movement to horizontal counter
@@ -298,11 +584,6 @@ class Background(Animate):
             self.y_offset -= 1
             self.parallax_y = 0
 
-    def update_render(self):
-        if self.frame_delay < pygame.time.get_ticks() - self.frame_time:
-            self.change_frame()
-            self.frame_time = pygame.time.get_ticks()
-
     def change_frame(self):
         if self.img_index < self.len - 1:
             self.img_index += 1
@@ -328,16 +609,21 @@ class Memory:
         self.loaded = None
 
     def save_data(self, out_path, save_name):
-        """ Save a single object to the pickle file"""
-        with open(out_path + save_name, "wb") as game_file:
+        """ Save a single object to the pickle file. It's written next
+        to the old file first, then swapped in all at once"""
+        with open(out_path + save_name + ".tmp", "wb") as game_file:
             self.compile_rect()
             pickle.dump(self.loaded, game_file)
+        os.replace(out_path + save_name + ".tmp", out_path + save_name)
 
-    def load_data(self, in_path, save_name):
+    def load_data(self, in_path, save_name, level_file=None):
         """ Load one object from a preset pickle file. Files are
         usually modified or added to using the save_data
-        function in this class"""
-        if len(os.listdir(in_path)) < 1 or save_name not in os.listdir(in_path):
+        function in this class. Read from level_file instead
+        if it's an open LevelFile (or LevelData) with save_name in it"""
+        if level_file is not None and save_name in level_file:
+            self.loaded = level_file.read(save_name)
+        elif len(os.listdir(in_path)) < 1 or save_name not in os.listdir(in_path):
             self.loaded = []
         else:
             with open(in_path + save_name, "rb") as game_file:
@@ -354,25 +640,27 @@ class Memory:
         """ Load a scene from a pickle file"""
         pass
 
-    def load_image(self, in_path):
+    def load_image(self, in_path, atlas=None):
         """ Load images from a file path. These images are
         usually used to blit over existing Rects. Therefore,
-        the x and y parameters are left at 0."""
+        the x and y parameters are left at 0. Images packed
+        in atlas (see load_atlas) are taken from it."""
         self.loaded = []
         for each_image in os.listdir(in_path):
             img_id = int(str(each_image).split("_")[1][:-4])
             in_img = Image(in_path, each_image,
-                           0, 0, 0, 0, img_id)
+                           0, 0, 0, 0, img_id, atlas)
             in_img.img_width = in_img.get_width()
             in_img.img_height = in_img.get_height()
             self.loaded += [in_img]
 
-    def load_animation(self, in_path):
+    def load_animation(self, in_path, atlas=None):
         """ Load animations from a file path. Files must be
         in the form of a spritesheet to use this method.
         The width and height must be specified for each animation asset
         in the file name. Spritesheet file names will follow this naming
-        convention: FILENAME_ID_FRAMEDELAY_WIDTH_HEIGHT"""
+        convention: FILENAME_ID_FRAMEDELAY_WIDTH_HEIGHT
+        Spritesheets packed in atlas (see load_atlas) are taken from it."""
         self.loaded = []
         def_x, def_y = 0, 0
         for each_image in os.listdir(in_path):
@@ -382,7 +670,7 @@ class Memory:
             width = int(in_img[3])
             height = int(in_img[4].split(".")[0])
             in_ani = Animate(in_path, each_image, frame_delay,
-                             def_x, def_y, width, height, ani_id)
+                             def_x, def_y, width, height, ani_id, atlas)
             self.loaded += [in_ani]
 
     def load_bg(self, in_path):
@@ -405,18 +693,31 @@ class Memory:
                                 pf, def_x, def_y, width, height, bg_id)
             self.loaded += [in_ani]
 
-    def default_load(self, in_path, save_name):
-        """ Default loading for built-in python types"""
-        if len(os.listdir(in_path)) < 1 or save_name not in os.listdir(in_path):
+    def load_atlas(self, in_path):
+        """ Load a TextureAtlas saved in in_path, or None if
+        there isn't one. Build it with TextureAtlas.pack and save"""
+        if not os.path.isdir(in_path) or "atlas_table" not in os.listdir(in_path):
+            self.loaded = None
+        else:
+            self.loaded = TextureAtlas()
+            self.loaded.load(in_path)
+
+    def default_load(self, in_path, save_name, level_file=None):
+        """ Default loading for built-in python types, read from
+        level_file instead if it has save_name (see load_data)"""
+        if level_file is not None and save_name in level_file:
+            self.loaded = level_file.read(save_name)
+        elif len(os.listdir(in_path)) < 1 or save_name not in os.listdir(in_path):
             self.loaded = []
         else:
             with open(in_path + save_name, "rb") as game_file:
                 self.loaded = pickle.load(game_file)
 
     def default_save(self, out_path, save_name):
-        """ Default saving for built-in python types"""
-        with open(out_path + save_name, "wb") as game_file:
+        """ Default saving for built-in python types, swapped in like save_data"""
+        with open(out_path + save_name + ".tmp", "wb") as game_file:
             pickle.dump(self.loaded, game_file)
+        os.replace(out_path + save_name + ".tmp", out_path + save_name)
 
     def compile_rect(self):
         """ Converts self.loaded into a list of lists containing rect
@@ -459,6 +760,1133 @@ class Memory:
         self.loaded = foo_list
 
 
+class TextureAtlas:
+    """
+    Tile images and animation sheets packed together onto a few large surfaces (pages).
+        The table maps each packed file to the page it is on and its area there, so loading
+        a level makes subsurfaces of the pages instead of one surface per file, and frames
+        can be blitted straight from a page with a source area.
+
+        Build it once with pack and save (python psC_main.py --build-atlas), then load it
+        with Memory.load_atlas. Files changed or added since the build are left out and
+        loaded from their own file as usual.
+    """
+
+    def __init__(self):
+        self.pages = []    # Packed surfaces
+        self.entries = {}    # (folder name, file name) -> (page index, Rect on the page, file mtime, file size)
+
+    def pack(self, folders, page_size=2048):
+        """ Pack every image file in folders onto pages of page_size x page_size,
+        tallest first in rows (shelves). Files bigger than a page are left out"""
+        sources = []
+        for each_folder in folders:
+            for each_image in os.listdir(each_folder):
+                file_stat = os.stat(each_folder + "/" + each_image)
+                sources += [(os.path.basename(each_folder), each_image,
+                             pygame.image.load(each_folder + "/" + each_image),
+                             file_stat.st_mtime_ns, file_stat.st_size)]
+        sources.sort(key=lambda source: source[2].get_height(), reverse=True)
+
+        self.pages = []
+        self.entries = {}
+        used_heights = []
+        shelf_x, shelf_y, shelf_height = 0, 0, 0
+        for folder_name, each_image, image, mtime, size in sources:
+            width, height = image.get_size()
+            if page_size < width or page_size < height:
+                continue
+            if page_size < shelf_x + width:
+                # Start a new shelf under the current one
+                shelf_x, shelf_y, shelf_height = 0, shelf_y + shelf_height, 0
+            if len(self.pages) < 1 or page_size < shelf_y + height:
+                # Start a new page
+                self.pages += [pygame.Surface((page_size, page_size), pygame.SRCALPHA)]
+                used_heights += [0]
+                shelf_x, shelf_y, shelf_height = 0, 0, 0
+
+            # BLEND_RGBA_MAX over the empty page copies the pixels and alpha as they are
+            self.pages[-1].blit(image, (shelf_x, shelf_y), special_flags=pygame.BLEND_RGBA_MAX)
+            self.entries[(folder_name, each_image)] = (len(self.pages) - 1,
+                                                       pygame.Rect(shelf_x, shelf_y, width, height),
+                                                       mtime, size)
+            shelf_x += width
+            shelf_height = max(shelf_height, height)
+            used_heights[-1] = max(used_heights[-1], shelf_y + height)
+
+        # Drop the unused bottom of each page
+        for page_index in range(len(self.pages)):
+            self.pages[page_index] = self.pages[page_index].subsurface(
+                pygame.Rect(0, 0, page_size, used_heights[page_index])).copy()
+
+    def save(self, out_path):
+        """ Save the pages as PNG files and the table as a pickle file in out_path"""
+        if not os.path.isdir(out_path):
+            os.makedirs(out_path)
+        for page_index in range(len(self.pages)):
+            pygame.image.save(self.pages[page_index], out_path + "/atlas_" + str(page_index) + ".png")
+        with open(out_path + "/atlas_table", "wb") as table_file:
+            pickle.dump({"pages": len(self.pages),
+                         "entries": {each_key: (page_index, [area.x, area.y, area.width, area.height],
+                                                mtime, size)
+                                     for each_key, (page_index, area, mtime, size)
+                                     in self.entries.items()}}, table_file)
+
+    def load(self, in_path):
+        """ Load pages and table saved with save"""
+        with open(in_path + "/atlas_table", "rb") as table_file:
+            table = pickle.load(table_file)
+        self.pages = []
+        for page_index in range(table["pages"]):
+            page = pygame.image.load(in_path + "/atlas_" + str(page_index) + ".png")
+            if pygame.display.get_surface() is not None:
+                page = page.convert_alpha()
+            self.pages += [page]
+        self.entries = {each_key: (page_index, pygame.Rect(area), mtime, size)
+                        for each_key, (page_index, area, mtime, size) in table["entries"].items()}
+
+    def get(self, folder, asset_name):
+        """ Subsurface of a packed file, or None if the file isn't packed or changed since"""
+        each_key = (os.path.basename(folder), asset_name)
+        if each_key not in self.entries:
+            return None
+        page_index, area, mtime, size = self.entries[each_key]
+        file_stat = os.stat(folder + "/" + asset_name)
+        if file_stat.st_mtime_ns != mtime or file_stat.st_size != size:
+            return None
+        return self.pages[page_index].subsurface(area)
+
+
+class PixelCache:
+    """
+    Decoded image files kept on disk as raw pixels (in PIXEL_CACHE_FOLDER), so starting the game
+        copies pixels out of a memory mapped file instead of decoding every PNG again.
+        A cache file is named after the hash of the image file and the pixel format of the display,
+        so a changed file or another display format never uses old pixels. Sprite sheets also keep
+        their table of frame areas (see slice_frames) in the cache file. Reading doesn't need the
+        display, so it can run on the AssetLoader workers. When an image file changes, the cache
+        file of its old contents is removed, and prune clears out files no image uses anymore.
+
+        Cache file layout: header (PIXEL_HEADER: magic, width, height, frame width, frame height,
+        frame count), then one PIXEL_FRAME record per frame, then the pixels row by row.
+        Use PIXEL_CACHE, images not in the atlas are loaded through it (see AssetLoader.decode).
+    """
+
+    def __init__(self, folder=PIXEL_CACHE_FOLDER):
+        self.folder = folder
+        self.pixel_format = None    # Byte order of the pixels, worked out from the display once
+        self.keys = {}    # Image file path -> its cache key, to find the old file when the image changes
+        self.lock = threading.Lock()    # Keys are made on the AssetLoader workers
+
+    def get_format(self):
+        # Pixel byte order matching the display (RGBA without one), so the pixels copy straight over
+        if self.pixel_format is None:
+            self.pixel_format = "RGBA"
+            if pygame.display.get_surface() is not None:
+                masks = tuple(pygame.Surface((1, 1), pygame.SRCALPHA).convert_alpha().get_masks())
+                self.pixel_format = PIXEL_FORMATS.get(masks, "RGBA")
+        return self.pixel_format
+
+    def key(self, in_path):
+        """ Cache file name for the image file at in_path. If the file changed since
+        its last key, the cache file of the old contents is removed"""
+        with open(in_path, "rb") as image_file:
+            cache_key = hashlib.sha1(image_file.read()).hexdigest() + "_" + self.get_format()
+        with self.lock:
+            old_key = self.keys.get(in_path)
+            self.keys[in_path] = cache_key
+            # Identical image files share a cache file, keep it while one of them uses it
+            if old_key is not None and old_key != cache_key and old_key not in self.keys.values():
+                self.remove(old_key)
+        return cache_key
+
+    def remove(self, cache_key):
+        # Delete one cache file, if it's there
+        try:
+            os.remove(self.folder + cache_key)
+        except OSError:
+            pass
+
+    def prune(self):
+        """ Remove every cache file not used by an image loaded so far, like ones left from
+        images changed or deleted while the game wasn't running. Run it once every asset
+        folder is loaded (see LoadingScene)"""
+        if not os.path.isdir(self.folder):
+            return None
+        with self.lock:
+            in_use = set(self.keys.values())
+        for each_file in os.listdir(self.folder):
+            if each_file not in in_use:
+                self.remove(each_file)
+
+    @staticmethod
+    def slice_frames(size, frame_width, frame_height):
+        # Area of every frame in a sprite sheet of size, row by row. Empty if it isn't a sprite sheet
+        if frame_width < 1 or frame_height < 1:
+            return []
+        return [pygame.Rect(x * frame_width, y * frame_height, frame_width, frame_height)
+                for y in range(size[1] // frame_height) for x in range(size[0] // frame_width)]
+
+    def read(self, cache_key):
+        """ Image, frame size and frame table from the cache file cache_key, or None for
+        all three if there is no usable cache file. The image is a copy of the pixels that
+        isn't converted to the display yet"""
+        if not os.path.isfile(self.folder + cache_key):
+            return None, None, None
+        try:
+            with open(self.folder + cache_key, "rb") as cache_file, \
+                    mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_READ) as cache_data:
+                magic, width, height, table_width, table_height, frame_count = \
+                    struct.unpack_from(PIXEL_HEADER, cache_data)
+                if magic != b"PSCP":
+                    return None, None, None
+                offset = struct.calcsize(PIXEL_HEADER)
+                frame_table = [pygame.Rect(each_frame) for each_frame in struct.iter_unpack(
+                    PIXEL_FRAME, cache_data[offset:offset + frame_count * struct.calcsize(PIXEL_FRAME)])]
+                offset += frame_count * struct.calcsize(PIXEL_FRAME)
+
+                pixels = memoryview(cache_data)[offset:offset + width * height * 4]
+                mapped = pygame.image.frombuffer(pixels, (width, height), self.get_format())
+                img = mapped.copy()    # Copy the pixels out, the mapped surface can't outlive the file
+                del mapped
+                pixels.release()
+        except (ValueError, struct.error):
+            return None, None, None    # Cut short or not a cache file, the image file is decoded instead
+        return img, (table_width, table_height), frame_table
+
+    def save(self, cache_key, img, frame_width=0, frame_height=0):
+        """ Write img and its frame table into the cache file cache_key. Nothing
+        is written if the cache folder can't be written to"""
+        frame_table = PixelCache.slice_frames(img.get_size(), frame_width, frame_height)
+        out_data = bytearray(struct.pack(PIXEL_HEADER, b"PSCP", img.get_width(), img.get_height(),
+                                         frame_width, frame_height, len(frame_table)))
+        for each_frame in frame_table:
+            out_data += struct.pack(PIXEL_FRAME, each_frame.x, each_frame.y,
+                                    each_frame.width, each_frame.height)
+        out_data += pygame.image.tobytes(img, self.get_format())
+        try:
+            if not os.path.isdir(self.folder):
+                os.makedirs(self.folder)
+            with open(self.folder + cache_key + ".tmp", "wb") as cache_file:
+                cache_file.write(out_data)
+            os.replace(self.folder + cache_key + ".tmp", self.folder + cache_key)
+        except OSError:
+            pass    # The image still loaded, it's decoded again next time
+
+
+PIXEL_CACHE = PixelCache()    # Shared by every Image
+
+
+class AssetLoader:
+    """
+    Decodes image files on a pool of worker threads before the scenes that use them are made.
+        Reading the file, hashing it and decoding the PNG (or copying the pixels out of PIXEL_CACHE)
+        run on the workers. Image takes the result with take, and only converting it to the display
+        format (convert_alpha) runs on the main thread. Images that weren't preloaded are decoded
+        by take on the spot, the same way. progress tells a loading screen how far it is.
+        Use ASSET_LOADER.
+    """
+
+    def __init__(self):
+        self.executor = None    # Made the first time something is preloaded
+        self.jobs = {}    # (folder, file name) -> Future of decode
+        self.total = 0    # Files preloaded so far
+        self.done = 0    # Of those, files decoded
+        self.lock = threading.Lock()    # Guards self.done, it's counted from the workers
+
+    def preload(self, folders, atlas=None):
+        """ Start decoding every file in folders, except files atlas has packed"""
+        PIXEL_CACHE.get_format()    # Worked out here, it needs the display
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor()
+        for each_folder in folders:
+            if not os.path.isdir(each_folder):
+                continue
+            for asset_name in os.listdir(each_folder):
+                if (each_folder, asset_name) in self.jobs or \
+                        (atlas is not None and atlas.get(each_folder, asset_name) is not None):
+                    continue
+                self.jobs[(each_folder, asset_name)] = self.executor.submit(self.decode, each_folder, asset_name)
+                self.jobs[(each_folder, asset_name)].add_done_callback(self.count_done)
+                self.total += 1
+
+    def count_done(self, future):
+        with self.lock:
+            self.done += 1
+
+    def decode(self, folder, asset_name):
+        """ Cache key, decoded image (not converted), and the frame size and frame table
+        from the pixel cache (both None if the image wasn't in the cache)"""
+        cache_key = PIXEL_CACHE.key(folder + "/" + asset_name)
+        img, frame_size, frame_table = PIXEL_CACHE.read(cache_key)
+        if img is None:
+            img = pygame.image.load(folder + "/" + asset_name)
+        return cache_key, img, frame_size, frame_table
+
+    def take(self, folder, asset_name):
+        """ What decode gives for one file, waiting for its worker if it was preloaded"""
+        if (folder, asset_name) in self.jobs:
+            return self.jobs.pop((folder, asset_name)).result()
+        return self.decode(folder, asset_name)
+
+    def progress(self):
+        # Files decoded and files preloaded
+        with self.lock:
+            return self.done, self.total
+
+    def finished(self):
+        done, total = self.progress()
+        return done == total
+
+
+ASSET_LOADER = AssetLoader()    # Shared by every Image
+
+
+class LevelFile:
+    """
+    A whole level in one binary file (LEVEL_FILE in the level's folder), instead of one pickle file
+        per save name. The file has a header (LEVEL_HEADER), then a table with one entry per save
+        name (LEVEL_SECTION), then each section as fixed width little endian records (LEVEL_RECORDS).
+        The file is memory mapped when opened, and a section is only decoded when it's read.
+        Opening a file that isn't a whole level file (empty, cut short, another format) raises
+        ValueError, LevelData then falls back to the pickle files.
+
+        Make one from a level's pickle files with convert. Memory.load_data and default_load read
+        from an open LevelFile when they are given one.
+    """
+
+    def __init__(self, in_path, file_name=LEVEL_FILE):
+        self.level_file = open(in_path + file_name, "rb")
+        # An empty file can't be mapped, check the size before anything is read
+        file_size = os.fstat(self.level_file.fileno()).st_size
+        if file_size < struct.calcsize(LEVEL_HEADER):
+            self.level_file.close()
+            raise ValueError("Level file is empty or cut short: " + in_path + file_name)
+        self.data = mmap.mmap(self.level_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, section_count = struct.unpack_from(LEVEL_HEADER, self.data)
+        if magic != b"PSCL" or version != 1:
+            self.close()
+            raise ValueError("Not a level file, or made by another version: " + in_path + file_name)
+
+        self.sections = {}    # Save name -> (record type, offset in the file, record count)
+        position = struct.calcsize(LEVEL_HEADER)
+        if file_size < position + section_count * struct.calcsize(LEVEL_SECTION):
+            self.close()
+            raise ValueError("Level file is cut short: " + in_path + file_name)
+        for _ in range(section_count):
+            save_name, record_type, offset, count = struct.unpack_from(LEVEL_SECTION, self.data, position)
+            # Every section has to be a known record type and fit in the file
+            if record_type not in LEVEL_RECORDS or \
+                    file_size < offset + count * struct.calcsize(LEVEL_RECORDS[record_type]):
+                self.close()
+                raise ValueError("Level file is cut short: " + in_path + file_name)
+            self.sections[save_name.rstrip(b"\0").decode()] = (record_type, offset, count)
+            position += struct.calcsize(LEVEL_SECTION)
+
+    def __contains__(self, save_name):
+        return save_name in self.sections
+
+    def read(self, save_name):
+        """ Decode one section into the same object load_data or default_load
+        would give from its pickle file"""
+        record_type, offset, count = self.sections[save_name]
+        record_size = struct.calcsize(LEVEL_RECORDS[record_type])
+        records = list(struct.iter_unpack(LEVEL_RECORDS[record_type],
+                                          self.data[offset:offset + count * record_size]))
+        if record_type == LEVEL_RECTS:
+            return [pygame.Rect(each_record) for each_record in records]
+        elif record_type == LEVEL_KIND_INTS:
+            kind_ints = {0: [], 1: [], 2: [], 3: [], 4: []}
+            for each_kind, each_int in records:
+                kind_ints.setdefault(each_kind, [])
+                kind_ints[each_kind] += [each_int]
+            return kind_ints
+        elif record_type == LEVEL_INT:
+            if len(records) < 1:
+                return []    # Nothing was saved, like a missing pickle file
+            return records[0][0]
+        return [each_record[0] for each_record in records]
+
+    def close(self):
+        self.data.close()
+        self.level_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @staticmethod
+    def write(out_path, saved, file_name=LEVEL_FILE):
+        """ Write a level file into out_path. saved maps each save name in
+        LEVEL_SECTIONS to its object, as loaded from the pickle files"""
+        sections = []
+        for save_name in LEVEL_SECTIONS:
+            sections += [(save_name,) + LevelFile.pack_section(save_name, saved.get(save_name, []))]
+
+        out_data = bytearray(struct.pack(LEVEL_HEADER, b"PSCL", 1, len(sections)))
+        offset = len(out_data) + len(sections) * struct.calcsize(LEVEL_SECTION)
+        for save_name, record_type, section_data, count in sections:
+            out_data += struct.pack(LEVEL_SECTION, save_name.encode(), record_type, offset, count)
+            offset += len(section_data)
+        for save_name, record_type, section_data, count in sections:
+            out_data += section_data
+
+        # Write next to the old file and swap it in, so the level is never half written
+        with open(out_path + file_name + ".tmp", "wb") as level_file:
+            level_file.write(out_data)
+            level_file.flush()
+            os.fsync(level_file.fileno())
+        os.replace(out_path + file_name + ".tmp", out_path + file_name)
+
+    @staticmethod
+    def pack_section(save_name, saved_obj):
+        # Record type, records as bytes and record count of one saved object
+        record_type = LEVEL_SECTIONS[save_name]
+        if record_type == LEVEL_RECTS:
+            records = [(each_rect[0], each_rect[1], each_rect[2], each_rect[3]) for each_rect in saved_obj]
+        elif record_type == LEVEL_KIND_INTS:
+            records = []
+            if type(saved_obj) is dict:
+                for each_kind in saved_obj:
+                    records += [(each_kind, each_int) for each_int in saved_obj[each_kind]]
+        elif record_type == LEVEL_INT:
+            records = [] if type(saved_obj) is not int else [(saved_obj,)]
+        else:
+            records = [(each_int,) for each_int in saved_obj]
+        return (record_type, b"".join(struct.pack(LEVEL_RECORDS[record_type], *each_record)
+                                      for each_record in records), len(records))
+
+    @staticmethod
+    def patch(out_path, saved, dirty, file_name=LEVEL_FILE):
+        """ Update only the sections in dirty of the level file in out_path, if it has one.
+        Changed sections are added after the old ones and the section table is pointed at them,
+        the other sections are copied as they are instead of being packed again. Like write,
+        the result replaces the old file in one step. The whole level is packed again once
+        old sections take up more room than the level does"""
+        if not os.path.isfile(out_path + file_name):
+            return None    # Levels without a level file are read from their pickle files
+        try:
+            level_file = LevelFile(out_path, file_name)
+        except ValueError:
+            LevelFile.write(out_path, saved, file_name)
+            return None
+        sections = dict(level_file.sections)
+        out_data = bytearray(level_file.data)
+        level_file.close()
+        file_size = len(out_data)
+        if set(sections) != set(LEVEL_SECTIONS):
+            LevelFile.write(out_path, saved, file_name)
+            return None
+
+        new_data = bytearray()
+        for save_name in dirty:
+            record_type, section_data, count = LevelFile.pack_section(save_name, saved.get(save_name, []))
+            sections[save_name] = (record_type, file_size + len(new_data), count)
+            new_data += section_data
+        level_size = struct.calcsize(LEVEL_HEADER) + len(sections) * struct.calcsize(LEVEL_SECTION)
+        for save_name in sections:
+            level_size += sections[save_name][2] * struct.calcsize(LEVEL_RECORDS[sections[save_name][0]])
+        if level_size * 2 < file_size + len(new_data):
+            LevelFile.write(out_path, saved, file_name)
+            return None
+
+        out_data += new_data
+        table_start = struct.calcsize(LEVEL_HEADER)
+        out_data[table_start:table_start + len(sections) * struct.calcsize(LEVEL_SECTION)] = b"".join(
+            struct.pack(LEVEL_SECTION, save_name.encode(), *sections[save_name]) for save_name in sections)
+
+        # Write next to the old file and swap it in, so the level is never half written
+        with open(out_path + file_name + ".tmp", "wb") as level_file:
+            level_file.write(out_data)
+            level_file.flush()
+            os.fsync(level_file.fileno())
+        os.replace(out_path + file_name + ".tmp", out_path + file_name)
+
+    @staticmethod
+    def convert(in_path):
+        """ Make the level file for the pickle files in in_path,
+        and split it into regions again if it was split before"""
+        LevelFile.write(in_path, LevelData(in_path, binary=False, regions=False).saved)
+        LevelFile.update_regions(in_path)
+
+    @staticmethod
+    def update_regions(in_path, saved=None, changed=None):
+        # Split the level in in_path into regions again, if it was split before. With the level's
+        # saved objects and the level positions of the elements that changed, only the regions
+        # those elements are in are written
+        if os.path.isfile(in_path + REGION_FOLDER + REGION_MANIFEST):
+            with open(in_path + REGION_FOLDER + REGION_MANIFEST, "rb") as manifest_file:
+                region_size = pickle.load(manifest_file)["region_size"]
+            only = None
+            if changed is not None:
+                only = set((each_x // region_size, each_y // region_size) for each_x, each_y in changed)
+            LevelFile.split_regions(in_path, region_size, saved, only)
+
+    @staticmethod
+    def split_regions(in_path, region_size=2048, saved=None, only=None):
+        """ Split the level in in_path (or saved, its objects by save name) into region files
+        of region_size x region_size (elements go in the region of their top left corner),
+        with a manifest listing them. Levels with a manifest are streamed by region, see
+        RegionStreamer. Give only (region keys) to write just those regions of an earlier split"""
+        level_data = LevelData(in_path, regions=False, saved=saved)
+        asset_ids = level_data.read("save_asset")
+        asset_types = level_data.read("save_asset_id")
+        warps = level_data.read("save_level")
+        regions = {}    # (region x, region y) -> saved objects of the elements in that region
+        for each_id in range(len(ELEMENT_SAVES)):
+            level_rects = level_data.read(ELEMENT_SAVES[each_id])
+            for obj_ind in range(len(level_rects)):
+                region_key = (level_rects[obj_ind].x // region_size, level_rects[obj_ind].y // region_size)
+                if region_key not in regions:
+                    regions[region_key] = {"save_asset": {0: [], 1: [], 2: [], 3: [], 4: []},
+                                           "save_asset_id": {0: [], 1: [], 2: [], 3: [], 4: []},
+                                           "save_level": []}
+                    for save_name in ELEMENT_SAVES:
+                        regions[region_key][save_name] = []
+                regions[region_key][ELEMENT_SAVES[each_id]] += [level_rects[obj_ind]]
+                regions[region_key]["save_asset"][each_id] += [asset_ids[each_id][obj_ind]]
+                regions[region_key]["save_asset_id"][each_id] += [asset_types[each_id][obj_ind]]
+                if each_id == 1:
+                    regions[region_key]["save_level"] += [warps[obj_ind]]
+
+        if only is None:
+            # Replace any regions from an earlier split
+            if not os.path.isdir(in_path + REGION_FOLDER):
+                os.makedirs(in_path + REGION_FOLDER)
+            for old_file in os.listdir(in_path + REGION_FOLDER):
+                os.remove(in_path + REGION_FOLDER + old_file)
+            only = regions
+        for region_key in only:
+            if region_key in regions:
+                LevelFile.write(in_path + REGION_FOLDER, regions[region_key], LevelFile.region_file(region_key))
+            elif os.path.isfile(in_path + REGION_FOLDER + LevelFile.region_file(region_key)):
+                os.remove(in_path + REGION_FOLDER + LevelFile.region_file(region_key))    # Emptied
+        # Swapped in whole like the region files, a save cut short keeps the old manifest
+        with open(in_path + REGION_FOLDER + REGION_MANIFEST + ".tmp", "wb") as manifest_file:
+            pickle.dump({"region_size": region_size,
+                         "regions": list(regions),
+                         "warps": warps,    # Every warp in the level, for prefetching
+                         # Everything else the level needs, its elements are read by region
+                         "saved": {"save_bg": level_data.read("save_bg")}}, manifest_file)
+        os.replace(in_path + REGION_FOLDER + REGION_MANIFEST + ".tmp", in_path + REGION_FOLDER + REGION_MANIFEST)
+
+    @staticmethod
+    def region_file(region_key):
+        # File name of one region of a split level
+        return "region_" + str(region_key[0]) + "_" + str(region_key[1]) + ".pscl"
+
+
+class LevelData:
+    """
+    Every saved object of one level, read from its binary file (see LevelFile) or its pickle files.
+        Reading doesn't need pygame's display, so it can happen on a worker thread ahead of time
+        (see LevelPrefetcher) and the level is then built without touching the disk.
+        Memory.load_data and default_load read from it the same way as from an open LevelFile.
+        A level split into regions only has its manifest read here (unless regions is False),
+        the elements are read by region as they're needed (see RegionStreamer).
+        Give saved to use objects already in memory instead, like a level the editor just saved.
+    """
+
+    def __init__(self, in_path, binary=True, regions=True, saved=None):
+        self.saved = {}    # Save name -> object, as Memory loads it
+        self.regions = None    # Region manifest of a split level
+        if saved is not None:
+            self.saved = saved
+            return None
+        if regions and os.path.isfile(in_path + REGION_FOLDER + REGION_MANIFEST):
+            with open(in_path + REGION_FOLDER + REGION_MANIFEST, "rb") as manifest_file:
+                self.regions = pickle.load(manifest_file)
+            # The level starts empty, regions are added to it
+            for save_name in ELEMENT_SAVES + ["save_level"]:
+                self.saved[save_name] = []
+            self.saved["save_asset"] = {0: [], 1: [], 2: [], 3: [], 4: []}
+            self.saved["save_asset_id"] = {0: [], 1: [], 2: [], 3: [], 4: []}
+            self.saved.update(self.regions["saved"])
+            return None
+
+        level_file = None
+        if binary and os.path.isfile(in_path + LEVEL_FILE):
+            try:
+                level_file = LevelFile(in_path)
+            except ValueError:
+                level_file = None    # A broken level file, read the pickle files instead
+        for save_name in LEVEL_SECTIONS:
+            in_memory = Memory()
+            if LEVEL_SECTIONS[save_name] == LEVEL_RECTS:
+                in_memory.load_data(in_path, save_name, level_file)
+            else:
+                in_memory.default_load(in_path, save_name, level_file)
+            self.saved[save_name] = in_memory.loaded
+        if level_file is not None:
+            level_file.close()
+
+    def __contains__(self, save_name):
+        return save_name in self.saved
+
+    def read(self, save_name):
+        return self.saved[save_name]
+
+
+class LevelPrefetcher:
+    """
+    Reads levels into LevelData on a worker thread while the current level is played, so
+        warping to one of them doesn't stall on the disk. Levels ask for the levels their win
+        zones warp to, and next_level takes the result (waiting for it if it isn't done yet).
+        Use LEVEL_PREFETCHER.
+    """
+
+    def __init__(self, workers=1):
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self.pending = {}    # Level id -> Future of its LevelData
+
+    def prefetch(self, lv_ids):
+        """ Start reading the levels in lv_ids, and forget the ones read for any other level"""
+        for each_id in list(self.pending):
+            if each_id not in lv_ids:
+                self.pending.pop(each_id).cancel()
+        for each_id in lv_ids:
+            if each_id not in self.pending:
+                self.pending[each_id] = self.executor.submit(
+                    LevelData, "game_files/game_data/lv_" + str(each_id) + "/")
+
+    def take(self, lv_id):
+        """ LevelData of lv_id, or None if it wasn't prefetched or couldn't be read.
+        It's handed out once, a level changes the lists it's built from"""
+        if lv_id not in self.pending:
+            return None
+        try:
+            return self.pending.pop(lv_id).result()
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+            return None    # Load it again when the level is built, where the error can show
+
+
+LEVEL_PREFETCHER = LevelPrefetcher()    # Shared by every scene
+
+
+class RegionStreamer:
+    """
+    Keeps only the regions of a split level (see LevelFile.split_regions) around the camera in memory.
+        Regions within radius regions of the screen are read on a worker thread as the camera
+        moves, and regions more than radius + 1 away are dropped, so memory and the work done
+        each frame stay about the same however big the level is. The level adds and removes
+        their elements, see PlayLevel.stream_regions.
+    """
+
+    def __init__(self, in_path, manifest, radius=1):
+        self.in_path = in_path + REGION_FOLDER
+        self.region_size = manifest["region_size"]    # Width and height of a region in game units
+        self.available = set(manifest["regions"])    # Regions with elements in them
+        self.radius = radius    # Regions kept around the ones on screen
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.pending = {}    # Region key -> Future of its saved objects
+        self.resident = set()    # Regions the level has the elements of
+        self.last_range = None    # Regions around the screen at the last update
+
+    def region_range(self, view, radius):
+        # Left, top, right and bottom region around view, inclusive
+        return (view.x // self.region_size - radius, view.y // self.region_size - radius,
+                (view.x + view.width) // self.region_size + radius,
+                (view.y + view.height) // self.region_size + radius)
+
+    def read_region(self, region_key):
+        # Runs on the worker thread
+        with LevelFile(self.in_path, LevelFile.region_file(region_key)) as region_file:
+            return {save_name: region_file.read(save_name) for save_name in region_file.sections}
+
+    def update(self, view, wait=False):
+        """ Start reading the regions near view (the screen in level position) and find the ones
+        left far behind. Returns the (region key, saved objects) pairs read since the last
+        update and the region keys to remove. With wait, every read is finished first"""
+        dropped = []
+        near = self.region_range(view, self.radius)
+        if near != self.last_range:
+            self.last_range = near
+            for region_x in range(near[0], near[2] + 1):
+                for region_y in range(near[1], near[3] + 1):
+                    region_key = (region_x, region_y)
+                    if region_key in self.available and region_key not in self.resident and \
+                            region_key not in self.pending:
+                        self.pending[region_key] = self.executor.submit(self.read_region, region_key)
+
+            # One more region is kept on every side, so going back and forth over a border doesn't reload it
+            keep = self.region_range(view, self.radius + 1)
+            for region_key in list(self.resident) + list(self.pending):
+                if not (keep[0] <= region_key[0] <= keep[2] and keep[1] <= region_key[1] <= keep[3]):
+                    if region_key in self.pending:
+                        self.pending.pop(region_key).cancel()
+                    else:
+                        self.resident.remove(region_key)
+                        dropped += [region_key]
+
+        loaded = []
+        for region_key in list(self.pending):
+            if wait or self.pending[region_key].done():
+                loaded += [(region_key, self.pending.pop(region_key).result())]
+                self.resident.add(region_key)
+        return loaded, dropped
+
+
+class LevelIndex:
+    """
+    Every level in game_files/game_data, sorted by id, with some details about each one: how many
+        elements of each type it has, the area they cover, its background id and its warps.
+        The index is saved to a file, and refreshing it only reads levels whose files changed since
+        (by modified time), so finding a level is a dictionary or list lookup instead of listing
+        and parsing the level folders every time. Use LEVEL_INDEX.
+    """
+
+    def __init__(self, in_path="game_files/game_data/", index_path="game_files/level_index"):
+        self.in_path = in_path
+        self.index_path = index_path
+        self.levels = {}    # Level id -> details, see read_level
+        self.ids = []    # Level ids in order
+        self.positions = {}    # Level id -> position in self.ids
+        self.refreshed = False
+
+    def refresh(self):
+        """ Bring the index up to date with the level folders, reading only the levels that changed"""
+        if not self.refreshed and os.path.isfile(self.index_path):
+            with open(self.index_path, "rb") as index_file:
+                self.levels = pickle.load(index_file)
+        self.refreshed = True
+
+        changed = False
+        found = set()
+        for level_name in os.listdir(self.in_path):
+            if not os.path.isdir(self.in_path + level_name):
+                continue
+            lv_id = int(level_name.split("_")[-1])
+            found.add(lv_id)
+            stamp = self.level_stamp(self.in_path + level_name + "/")
+            if lv_id not in self.levels or self.levels[lv_id]["stamp"] != stamp:
+                self.levels[lv_id] = self.read_level(self.in_path + level_name + "/", stamp)
+                changed = True
+        for lv_id in set(self.levels) - found:
+            del self.levels[lv_id]
+            changed = True
+
+        self.ids = sorted(self.levels)
+        self.positions = {self.ids[position]: position for position in range(len(self.ids))}
+        if changed:
+            with open(self.index_path, "wb") as index_file:
+                pickle.dump(self.levels, index_file)
+
+    def level_stamp(self, level_path):
+        # Newest modified time in a level folder, changes when a file is written, added or removed
+        stamp = os.stat(level_path).st_mtime_ns
+        for each_file in os.listdir(level_path):
+            stamp = max(stamp, os.stat(level_path + each_file).st_mtime_ns)
+        return stamp
+
+    def read_level(self, level_path, stamp):
+        # Details of one level
+        level_data = LevelData(level_path, regions=False)
+        element_counts = {}
+        bounds = None    # Area covered by every element, [x, y, width, height]
+        for each_id in range(len(ELEMENT_SAVES)):
+            level_rects = level_data.read(ELEMENT_SAVES[each_id])
+            element_counts[each_id] = len(level_rects)
+            if 0 < len(level_rects):
+                area = level_rects[0].unionall(level_rects[1:])
+                if bounds is not None:
+                    area = area.union(pygame.Rect(bounds))
+                bounds = [area.x, area.y, area.width, area.height]
+        return {"stamp": stamp,
+                "elements": element_counts,
+                "bounds": bounds,
+                "bg": level_data.read("save_bg"),
+                "warps": list(level_data.read("save_level"))}
+
+    def info(self, lv_id):
+        # Details of one level, see read_level
+        if not self.refreshed:
+            self.refresh()
+        return self.levels[lv_id]
+
+    def position(self, lv_id):
+        # Position of a level in the level order
+        if not self.refreshed:
+            self.refresh()
+        return self.positions[lv_id]
+
+    def __getitem__(self, position):
+        # Level id at a position in the level order
+        if not self.refreshed:
+            self.refresh()
+        return self.ids[position]
+
+    def __contains__(self, lv_id):
+        if not self.refreshed:
+            self.refresh()
+        return lv_id in self.levels
+
+    def __len__(self):
+        if not self.refreshed:
+            self.refresh()
+        return len(self.ids)
+
+
+LEVEL_INDEX = LevelIndex()    # Shared by every scene, refreshed when Program starts
+
+
+class AssetRegistry:
+    """
+    Images, animations, backgrounds and the atlas loaded once per run and shared by every scene.
+        Levels are built again on every death, reload and switch to or from the editor, so
+        without this each of them would list the asset folders and decode every file again.
+        Use ASSET_REGISTRY, and invalidate it after asset files change on disk.
+
+        With watch_every set, poll checks the modified times of the loaded folders' files every
+        watch_every calls (Program calls it once per frame). A changed file is decoded again into
+        the asset already loaded from it, so running scenes show it on their next frame. Added or
+        removed files read the whole folder again into the same Memory.
+    """
+
+    def __init__(self):
+        self.assets = {}    # (Memory load function name, folder) -> Memory holding what it loaded
+        self.load_args = {}    # Same keys -> extra arguments the load function was called with
+        self.stamps = {}    # Same keys -> {file name: modified time in ns} when it was loaded
+        self.watch_every = 0    # Calls to poll between checks of the folders, 0 to not check
+        self.poll_count = 0
+        self.version = 0    # Goes up every time assets are reloaded, see check_assets in the levels
+
+    def load(self, load_name, in_path, *load_args):
+        """ Memory loaded with Memory.<load_name>(in_path, *load_args) the first time
+        it's asked for, the same Memory every time after that"""
+        if (load_name, in_path) not in self.assets:
+            in_memory = Memory()
+            getattr(in_memory, load_name)(in_path, *load_args)
+            self.assets[(load_name, in_path)] = in_memory
+            self.load_args[(load_name, in_path)] = load_args
+            self.stamps[(load_name, in_path)] = self.stat_folder(in_path)
+        return self.assets[(load_name, in_path)]
+
+    def invalidate(self, in_path=None):
+        """ Forget the assets loaded from in_path, or everything if in_path is None,
+        so they're loaded again the next time a scene asks for them"""
+        for each_key in list(self.assets):
+            if in_path is None or each_key[1] == in_path:
+                del self.assets[each_key]
+                del self.load_args[each_key]
+                del self.stamps[each_key]
+
+    def stat_folder(self, in_path):
+        # Modified time of every file in a folder, one scandir call
+        if not os.path.isdir(in_path):
+            return {}
+        return {each_entry.name: each_entry.stat().st_mtime_ns for each_entry in os.scandir(in_path)
+                if each_entry.is_file()}
+
+    def poll(self):
+        # Check the folders for changed files every self.watch_every calls
+        if self.watch_every < 1:
+            return None
+        self.poll_count += 1
+        if self.poll_count < self.watch_every:
+            return None
+        self.poll_count = 0
+        self.check()
+
+    def check(self):
+        """ Reload the assets whose files changed since they were loaded.
+        Returns how many folders had changes"""
+        changed_folders = 0
+        for each_key in list(self.assets):
+            load_name, in_path = each_key
+            stamps = self.stat_folder(in_path)
+            if stamps == self.stamps[each_key]:
+                continue
+            in_memory = self.assets[each_key]
+            try:
+                if set(stamps) != set(self.stamps[each_key]) or type(in_memory.loaded) is not list:
+                    # Files were added or removed (or it's the atlas), read the folder again
+                    getattr(in_memory, load_name)(in_path, *self.load_args[each_key])
+                else:
+                    for each_asset in in_memory.loaded:
+                        if stamps[each_asset.asset_name] != self.stamps[each_key][each_asset.asset_name]:
+                            each_asset.reload()
+            except pygame.error:
+                continue    # Most likely still being written, try again on the next check
+            self.stamps[each_key] = stamps
+            changed_folders += 1
+        if 0 < changed_folders:
+            self.version += 1
+        return changed_folders
+
+
+ASSET_REGISTRY = AssetRegistry()    # Shared by every scene
+
+
+class SpatialHash:
+    """
+    Uniform grid that buckets level elements by the cells their rects overlap.
+        Asking for the elements near a rect only looks through the few cells under that rect,
+        instead of the whole list. Elements are tracked by identity, so the same Rect object
+        used to insert an element has to be used to remove it.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size    # Width and height of one cell in game units
+        self.cells = {}    # (cell_x, cell_y) -> {insert order: element}
+        self.entries = {}    # id(element) -> (insert order, cells the element is stored in)
+        self.counter = 0    # Increases with every insert, keeps queries in list order
+
+    def cell_range(self, rect):
+        # Get every cell key a rect covers
+        left = rect.x // self.cell_size
+        right = (rect.x + rect.width) // self.cell_size
+        top = rect.y // self.cell_size
+        bottom = (rect.y + rect.height) // self.cell_size
+        return [(cell_x, cell_y) for cell_x in range(left, right + 1)
+                for cell_y in range(top, bottom + 1)]
+
+    def insert(self, element, rect=None):
+        """ Add an element to every cell its rect overlaps. An element is its
+        own rect (a level Rect) unless another rect is given"""
+        if rect is None:
+            rect = element
+        cell_keys = self.cell_range(rect)
+        for each_key in cell_keys:
+            if each_key not in self.cells:
+                self.cells[each_key] = {}
+            self.cells[each_key][self.counter] = element
+        self.entries[id(element)] = (self.counter, cell_keys)
+        self.counter += 1
+
+    def remove(self, element):
+        """ Take an element out of the cells it was inserted into"""
+        if id(element) not in self.entries:
+            return None
+        order, cell_keys = self.entries.pop(id(element))
+        for each_key in cell_keys:
+            del self.cells[each_key][order]
+            if len(self.cells[each_key]) < 1:
+                del self.cells[each_key]
+
+    def query(self, rect):
+        """ Get every element stored in the cells under rect, in the order they were inserted.
+        These are candidates only, they still need a proper collision check"""
+        found = {}
+        for each_key in self.cell_range(rect):
+            if each_key in self.cells:
+                found.update(self.cells[each_key])
+        return [found[order] for order in sorted(found)]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class ElementStore:
+    """
+    Level elements kept as NumPy columns (x, y, width, height, element type, asset id and render type),
+        one row per element. Element type is the same key used in the element dictionary of a level
+        (0 platforms, 1 wins, 2 deaths, 3 respawns, 4 decorations). Culling works on whole columns
+        at once, so it stays a handful of array operations for any level size. The editor finds
+        elements by area with a SpatialHash instead.
+        Each row also knows its index in the level's list for its type (list_index), and self.rows
+        goes the other way, so adding or removing one element only touches a few rows.
+        Requires numpy, levels fall back to looping over their Rect lists without it.
+    """
+
+    def __init__(self, capacity=256):
+        self.size = 0    # Rows in use, the arrays are allocated ahead of time
+        self.rows = {}    # Element type -> row of each element, in the level's list order
+        self.x = numpy.zeros(capacity, dtype=numpy.int32)
+        self.y = numpy.zeros(capacity, dtype=numpy.int32)
+        self.width = numpy.zeros(capacity, dtype=numpy.int32)
+        self.height = numpy.zeros(capacity, dtype=numpy.int32)
+        self.kind = numpy.zeros(capacity, dtype=numpy.int8)
+        self.asset_id = numpy.zeros(capacity, dtype=numpy.int32)
+        self.render_type = numpy.zeros(capacity, dtype=numpy.int8)
+        self.list_index = numpy.zeros(capacity, dtype=numpy.int32)
+
+    def columns(self):
+        # Every column in the same order, used when resizing or removing rows
+        return [self.x, self.y, self.width, self.height,
+                self.kind, self.asset_id, self.render_type, self.list_index]
+
+    def reserve(self, capacity):
+        # Grow every column to hold at least capacity rows
+        if capacity <= len(self.x):
+            return None
+        capacity = max(capacity, len(self.x) * 2)
+        grown = []
+        for each_column in self.columns():
+            grown += [numpy.zeros(capacity, dtype=each_column.dtype)]
+            grown[-1][:self.size] = each_column[:self.size]
+        self.x, self.y, self.width, self.height, self.kind, self.asset_id, self.render_type, \
+            self.list_index = grown
+
+    def load_level(self, element, asset_ids, asset_types):
+        """ Fill the store from a level's element dictionary and its parallel
+        asset id and render type lists"""
+        self.size = 0
+        self.rows = {}
+        self.reserve(sum(len(element[each_id]) for each_id in element))
+        for each_id in element:
+            amount = len(element[each_id])
+            self.rows[each_id] = list(range(self.size, self.size + amount))
+            if amount < 1:
+                continue
+            rects = numpy.array([[each_rect.x, each_rect.y, each_rect.width, each_rect.height]
+                                 for each_rect in element[each_id]], dtype=numpy.int32)
+            rows = slice(self.size, self.size + amount)
+            self.x[rows] = rects[:, 0]
+            self.y[rows] = rects[:, 1]
+            self.width[rows] = rects[:, 2]
+            self.height[rows] = rects[:, 3]
+            self.kind[rows] = each_id
+            self.asset_id[rows] = asset_ids[each_id]
+            self.render_type[rows] = asset_types[each_id]
+            self.list_index[rows] = numpy.arange(amount)
+            self.size += amount
+
+    def append(self, rect, kind, asset_id, render_type):
+        """ Add one element as the last row, and the last element of its type"""
+        self.reserve(self.size + 1)
+        row = self.size
+        self.x[row] = rect.x
+        self.y[row] = rect.y
+        self.width[row] = rect.width
+        self.height[row] = rect.height
+        self.kind[row] = kind
+        self.asset_id[row] = asset_id
+        self.render_type[row] = render_type
+        self.list_index[row] = len(self.rows.setdefault(kind, []))
+        self.rows[kind] += [row]
+        self.size += 1
+        return row
+
+    def insert(self, kind, index, rect, asset_id, render_type):
+        """ Add one element at index in the list for its type. The element already there
+        moves to the end of that list, like EditLevel.add_element does with the level's lists"""
+        row = self.append(rect, kind, asset_id, render_type)
+        kind_rows = self.rows[kind]
+        if index < len(kind_rows) - 1:
+            kind_rows[index], kind_rows[-1] = row, kind_rows[index]
+            self.list_index[kind_rows[-1]] = len(kind_rows) - 1
+            self.list_index[row] = index
+        return row
+
+    def remove(self, kind, index):
+        """ Remove the element at index in the list for its type. The last element of that
+        type takes its index, and the last row takes its row, so no other rows move"""
+        kind_rows = self.rows[kind]
+        row = kind_rows[index]
+        kind_rows[index] = kind_rows[-1]
+        self.list_index[kind_rows[index]] = index
+        kind_rows.pop()
+
+        last_row = self.size - 1
+        if row != last_row:
+            for each_column in self.columns():
+                each_column[row] = each_column[last_row]
+            self.rows[int(self.kind[row])][int(self.list_index[row])] = row
+        self.size -= 1
+
+    def row_of(self, kind, index):
+        # Row of the element at index in the level's list for that element type
+        return self.rows[kind][index]
+
+    def index_of(self, row):
+        # Index in the level's list for the element type of row
+        return int(self.list_index[row])
+
+    def cull(self, view):
+        """ Rows touching the view rect (edges included), sorted by element type and list
+        index so they are drawn in the same order as the element dictionary"""
+        hits = (self.x[:self.size] <= view.x + view.width) & \
+               (view.x <= self.x[:self.size] + self.width[:self.size]) & \
+               (self.y[:self.size] <= view.y + view.height) & \
+               (view.y <= self.y[:self.size] + self.height[:self.size])
+        rows = numpy.flatnonzero(hits)
+        return rows[numpy.lexsort((self.list_index[rows], self.kind[rows]))]
+
+    def rect(self, row):
+        # Rebuild a pygame Rect for one row
+        return pygame.Rect(int(self.x[row]), int(self.y[row]),
+                           int(self.width[row]), int(self.height[row]))
+
+    def __len__(self):
+        return self.size
+
+
+class ChunkCache:
+    """
+    Static (not animated) level tiles drawn ahead of time onto chunk surfaces, each covering a
+        chunk_size x chunk_size square of the level. A frame then only blits the few chunks on screen
+        instead of every tile. Chunks are drawn the first time they are seen, and drawn again only
+        after a tile inside them is added or removed (see invalidate).
+    """
+
+    def __init__(self, chunk_size, max_chunks=64):
+        self.chunk_size = chunk_size    # Width and height of a chunk in game units
+        self.max_chunks = max_chunks    # Drawn chunks kept before off screen ones are dropped
+        self.tiles = SpatialHash(chunk_size)    # Static tiles by the chunk they are in
+        self.tile_info = {}    # id(tile rect) -> (element type, image, area the image covers)
+        self.chunks = {}    # (chunk_x, chunk_y) -> drawn Surface, or None if the chunk is empty
+
+    def add_tile(self, rect, each_id, image):
+        """ Add a static tile, drawn with image at the top left of rect"""
+        image_area = pygame.Rect(rect.x, rect.y, image.get_width(), image.get_height())
+        self.tile_info[id(rect)] = (each_id, image, image_area)
+        self.tiles.insert(rect, image_area)
+        self.invalidate(image_area)
+
+    def remove_tile(self, rect):
+        """ Remove a static tile, rect must be the same Rect given to add_tile"""
+        if id(rect) not in self.tile_info:
+            return None
+        self.tiles.remove(rect)
+        self.invalidate(self.tile_info.pop(id(rect))[2])
+
+    def invalidate(self, area):
+        # Drop the chunks under area so they are drawn again the next time they are on screen
+        if len(self.chunks) < 1:
+            return None    # Nothing drawn yet, like while a level is built
+        for each_key in self.tiles.cell_range(area):
+            self.chunks.pop(each_key, None)
+
+    def clear(self):
+        # Drop every chunk, used when tile images change
+        self.chunks = {}
+
+    def bake(self, chunk_key):
+        """ Draw every static tile touching one chunk onto a new surface"""
+        chunk_area = pygame.Rect(chunk_key[0] * self.chunk_size, chunk_key[1] * self.chunk_size,
+                                 self.chunk_size, self.chunk_size)
+        chunk_tiles = [each_tile for each_tile in self.tiles.query(chunk_area)
+                       if self.tile_info[id(each_tile)][2].colliderect(chunk_area)]
+        if len(chunk_tiles) < 1:
+            return None
+
+        chunk = pygame.Surface((self.chunk_size, self.chunk_size), pygame.SRCALPHA)
+        if pygame.display.get_surface() is not None:
+            chunk = chunk.convert_alpha()
+        # Draw by element type first, like the element dictionary order
+        for each_tile in sorted(chunk_tiles, key=lambda tile: self.tile_info[id(tile)][0]):
+            chunk.blit(self.tile_info[id(each_tile)][1],
+                       (each_tile.x - chunk_area.x, each_tile.y - chunk_area.y))
+        return chunk
+
+    def render(self, screen, view, camera_x, camera_y):
+        """ Blit the chunks touching view (the screen in level position)"""
+        on_screen = self.tiles.cell_range(view)
+        for each_key in on_screen:
+            if each_key not in self.chunks:
+                self.chunks[each_key] = self.bake(each_key)
+            if self.chunks[each_key] is not None:
+                screen.blit(self.chunks[each_key], (each_key[0] * self.chunk_size + camera_x,
+                                                    each_key[1] * self.chunk_size + camera_y))
+
+        # Keep memory in check by dropping chunks that are off screen
+        if self.max_chunks < len(self.chunks):
+            for each_key in set(self.chunks) - set(on_screen):
+                del self.chunks[each_key]
+
+
 class Scene:
     """
     Class template for creating scene based games
@@ -473,6 +1901,8 @@ class Scene:
         self.this_scene = self
         self.run_scene = True
         self.level_id = -1
+        self.sim_time = 0    # Milliseconds simulated in this scene, used for input/physics timers
+        self.full_render = True    # Draw everything each frame, Program turns this off for dirty rects
 
     def input(self, pressed, held):
         # this will be overridden in subclasses
@@ -510,10 +1940,20 @@ class Scene:
         This function is solely used for rendering purposes such as
         screen.blit or pygame.draw
         :param screen:
-        :return:
+        :return: None if the whole screen may have changed, or a list of
+        Rects of the areas that changed (empty if nothing did). Only
+        areas that changed need drawing when self.full_render is False
         """
         pass
 
+    def step_time(self, step_ms):
+        """
+        Advance the simulated clock by one fixed step. Program calls this
+        before every input/update step, so timers compared against
+        self.sim_time behave the same no matter how fast frames are rendered.
+        """
+        self.sim_time += step_ms
+
     def change_scene(self, next_scene):
         """
         This function is used in the main pygame loop. This function is
@@ -530,12 +1970,49 @@ class Scene:
         self.change_scene(None)
 
 
+class LoadingScene(Scene):
+    """
+    Loading screen shown while ASSET_LOADER decodes the asset folders. Once everything is decoded it
+        changes to the scene made by next_scene, a function so that scene is only made (and takes
+        its assets) after the decoding is done.
+    """
+
+    def __init__(self, width, height, next_scene, folders=ASSET_FOLDERS):
+        Scene.__init__(self)
+        self.res_width = width
+        self.res_height = height
+        self.next_scene = next_scene
+        ASSET_LOADER.preload(folders, ASSET_REGISTRY.load("load_atlas", "game_files/psC_atlas").loaded)
+
+        self.loading_text = Text("Loading", (width / 2, 4 * (height / 10)),
+                                 50, "impact", DARK_RED, None)
+        self.loading_bar = pygame.Rect(width / 4, 6 * (height / 10), width / 2, 20)
+
+    def update(self):
+        if ASSET_LOADER.finished():
+            PIXEL_CACHE.prune()    # Every image file has its key now, the rest are old
+            self.change_scene(self.next_scene())
+
+    def render(self, screen):
+        done, total = ASSET_LOADER.progress()
+        screen.fill(BLACK)
+        self.loading_text.text = "Loading " + str(done) + " / " + str(total)
+        self.loading_text.render()
+        screen.blit(self.loading_text.text_img, self.loading_text.text_rect)
+        # Bar filled by the share of files decoded
+        pygame.draw.rect(screen, WHITE, (self.loading_bar.x, self.loading_bar.y,
+                                         self.loading_bar.width * done // max(total, 1),
+                                         self.loading_bar.height))
+        pygame.draw.rect(screen, GREY, self.loading_bar, 2)
+        return None
+
+
 class PlayLevel(Scene):
     """
     Class to play or start the platformer, using information from the game_files folder path
     """
     
-    def __init__(self, x_spawn, y_spawn, width, height, lv_id):
+    def __init__(self, x_spawn, y_spawn, width, height, lv_id, level_data=None, stream_radius=1):
         Scene.__init__(self)    # Initialize basic scene functionality (changing/ending scene)
         # Put pygame objects that need rendering into here
         self.platforms = []  # All platforms for that level (collision)
@@ -547,6 +2024,11 @@ class PlayLevel(Scene):
         self.invis_rect = pygame.Rect(x_spawn, y_spawn, 1, 1)   # rect comparing player position
         self.invis_rect.center = (x_spawn, y_spawn)
 
+        # Level elements keep their level (world) position, the camera offset is only
+        # added when they are drawn or compared against the player on screen
+        self.camera_x = 0
+        self.camera_y = 0
+
         self.x_spawn = x_spawn  # x player spawn
         self.y_spawn = y_spawn  # y player spawn
         self.player = Player(self.x_spawn, self.y_spawn,
@@ -579,62 +2061,75 @@ class PlayLevel(Scene):
         # Text displayed when player pauses the game (ESC)
 
         # Timer used to delay player jump
-        self.jump_timer = pygame.time.get_ticks()
+        self.jump_timer = self.sim_time
 
         self.res_height = height    # Game window height resolution
         self.res_width = width    # Game window width resolution
 
-        self.held_delay = pygame.time.get_ticks()    # Delay between inputs when keyboard is held
+        self.held_delay = self.sim_time    # Delay between inputs when keyboard is held
+
+        self.last_frame_state = None    # What was on screen last frame, see render_changed
+        self.frame_now = 0    # Animation clock, read once at the start of each render
 
-        # Load in game objects and images with Memory class
+        # Load in game objects and images with Memory class, from level_data if it was read ahead of time
+        if level_data is None:
+            level_data = LevelData("game_files/game_data/lv_" + str(self.level_id) + "/")
         
         self.memory_win_warp = Memory()
-        self.memory_win_warp.default_load("game_files/game_data/lv_" + str(self.level_id) + "/", "save_level")
+        self.memory_win_warp.default_load("game_files/game_data/lv_" + str(self.level_id) + "/", "save_level", level_data)
         self.level_memory = self.memory_win_warp.loaded
 
+        # Levels in the set order, win zone warps are positions in it. Read the ones warped to ahead of time
+        self.all_levels = LEVEL_INDEX
+        level_warps = self.level_memory
+        if level_data.regions is not None:
+            level_warps = level_data.regions["warps"]    # Most of a split level isn't loaded yet
+        LEVEL_PREFETCHER.prefetch([int(self.all_levels[each_warp]) for each_warp in level_warps
+                                   if -len(self.all_levels) <= each_warp < len(self.all_levels)])
+
         self.memory_plat = Memory()
-        self.memory_plat.load_data("game_files/game_data/lv_" + str(self.level_id) + "/", "save_plat")
+        self.memory_plat.load_data("game_files/game_data/lv_" + str(self.level_id) + "/", "save_plat", level_data)
         self.platforms = self.memory_plat.loaded
 
         self.memory_win = Memory()
-        self.memory_win.load_data("game_files/game_data/lv_" + str(self.level_id) + "/", "save_win")
+        self.memory_win.load_data("game_files/game_data/lv_" + str(self.level_id) + "/", "save_win", level_data)
         self.win_zones = self.memory_win.loaded
 
         self.memory_death = Memory()
         self.memory_death.load_data("game_files/game_data/lv_" + str(self.level_id) + "/",
-                                    "save_death")
+                                    "save_death", level_data)
         self.death_zones = self.memory_death.loaded
 
         self.memory_respawn = Memory()
         self.memory_respawn.load_data("game_files/game_data/lv_" + str(self.level_id) + "/",
-                                      "save_respawn")
+                                      "save_respawn", level_data)
         self.respawn_zones = self.memory_respawn.loaded
 
         self.memory_decor = Memory()
         self.memory_decor.load_data("game_files/game_data/lv_" + str(self.level_id) + "/",
-                                    "save_decor")
+                                    "save_decor", level_data)
         self.decorations = self.memory_decor.loaded
 
-        self.memory_img = Memory()
-        self.memory_img.load_image("game_files/psC_imgs")
-
-        self.memory_ani = Memory()
-        self.memory_ani.load_animation("game_files/psC_ani")
-
-        self.memory_bg = Memory()
-        self.memory_bg.load_bg("game_files/psC_bg")
+        # Assets are loaded once and shared with every other scene
+        self.memory_atlas = ASSET_REGISTRY.load("load_atlas", "game_files/psC_atlas")
+        self.memory_img = ASSET_REGISTRY.load("load_image", "game_files/psC_imgs",
+                                              self.memory_atlas.loaded)
+        self.memory_ani = ASSET_REGISTRY.load("load_animation", "game_files/psC_ani",
+                                              self.memory_atlas.loaded)
+        self.memory_bg = ASSET_REGISTRY.load("load_bg", "game_files/psC_bg")
+        SFX_BANK.load()    # Sound effects, only loaded by the first level
 
         self.memory_asset_id = Memory()
         self.memory_asset_id.default_load("game_files/game_data/lv_" + str(self.level_id) + "/",
-                                        "save_asset")
+                                        "save_asset", level_data)
 
         self.memory_asset_type = Memory()
         self.memory_asset_type.default_load("game_files/game_data/lv_" + str(self.level_id) + "/",
-                                        "save_asset_id")
+                                        "save_asset_id", level_data)
 
         self.memory_bg_id = Memory()
         self.memory_bg_id.default_load("game_files/game_data/lv_" + str(self.level_id) + "/",
-                                        "save_bg")
+                                        "save_bg", level_data)
 
         # Check if current files are absent, and make empty assets if so.
         
@@ -642,6 +2137,7 @@ class PlayLevel(Scene):
             self.scene_bg = self.memory_bg.loaded[0]
         else:
             self.scene_bg = self.memory_bg.loaded[self.memory_bg_id.loaded]
+        self.scene_bg.reset_position()    # Shared with earlier scenes, start from the middle again
 
         if self.memory_asset_id.loaded is None or \
                 self.memory_asset_id.loaded == []:
@@ -672,19 +2168,49 @@ class PlayLevel(Scene):
             4: self.decorations
         }
 
+        # Bucket the interactive level elements by area, so collision only checks nearby ones
+        self.element_hash = {}
+        for each_id in [0, 1, 2, 3]:
+            self.element_hash[each_id] = SpatialHash(128)
+            for each_rect in self.element[each_id]:
+                self.element_hash[each_id].insert(each_rect)
+
+        # Same elements as NumPy columns for culling and bulk overlap tests, if numpy is installed
+        self.element_store = None
+        if numpy is not None:
+            self.element_store = ElementStore()
+            self.element_store.load_level(self.element, self.memory_asset_id.loaded,
+                                          self.memory_asset_type.loaded)
+
+        # Static tiles are drawn ahead of time onto chunks, only animated ones are drawn every frame
+        self.build_chunks()
+        self.asset_version = ASSET_REGISTRY.version    # Registry version the chunks were built with
+
+        # Levels split into regions only keep the regions around the camera, see RegionStreamer
+        self.stream_radius = stream_radius    # Regions kept around the ones on screen
+        self.region_streamer = None
+        self.region_elements = {}    # Region key -> ids of the element Rects added with it
+        if level_data.regions is not None:
+            self.region_streamer = RegionStreamer("game_files/game_data/lv_" + str(self.level_id) + "/",
+                                                  level_data.regions, stream_radius)
+            self.stream_regions(wait=True)
+
+        # State of the level when it started, put back by reload instead of loading it again
+        self.start_state = self.snapshot()
+
     def input(self, pressed, held):
         for every_key in pressed:
             # Player movement bound to the middle of the screen
             if every_key is pygame.K_a and not self.player.disable_left and \
                     not self.player.freeze and \
                     self.player.alive:
-                move_left = self.player.smart_left(self.platforms)
+                move_left = self.player.smart_left(self.nearby(0))
                 self.update_plat_x(move_left)
                 self.scene_bg.bg_pos_x(move_left)
             if every_key is pygame.K_d and not self.player.disable_right and \
                     not self.player.freeze and \
                     self.player.alive:
-                move_right = self.player.smart_right(self.platforms)
+                move_right = self.player.smart_right(self.nearby(0))
                 self.update_plat_x(move_right)
                 self.scene_bg.bg_pos_y(move_right)
 
@@ -693,19 +2219,19 @@ class PlayLevel(Scene):
                     self.player.enable_gravity and \
                     self.player.alive and not \
                     self.player.freeze and \
-                    150 <= pygame.time.get_ticks() - self.jump_timer:
+                    150 <= self.sim_time - self.jump_timer:
                 self.player.jump_ability = True  # Allow player to jump
                 self.player.jump_boost = self.player.max_jump  # Setup jump
-                # self.player.jump_sound_1.play()  # Play jump sound
+                SFX_BANK.play("jump")  # Play jump sound
                 self.player.jumps += 1  # Add to a jump counter
-                self.jump_timer = pygame.time.get_ticks()  # Reset jump timer
+                self.jump_timer = self.sim_time  # Reset jump timer
 
             # Pressing the jump key to stop player freezing and start level
-            # This also updates the replay linked list
+            # Every key given to input is recorded by ReplayRecorder in Program.run
             if every_key in [pygame.K_w, pygame.K_UP, pygame.K_SPACE] \
                     and not self.player.alive:
                 self.player.alive = True
-                self.jump_timer = pygame.time.get_ticks()
+                self.jump_timer = self.sim_time
 
             # Pausing the game and stopping player movement/action
             if every_key == pygame.K_ESCAPE and not self.level_condition:
@@ -729,36 +2255,39 @@ class PlayLevel(Scene):
                 and not self.player.enable_gravity and \
                 self.player.alive and \
                 not self.player.freeze and \
-                150 <= pygame.time.get_ticks() - self.jump_timer:
+                150 <= self.sim_time - self.jump_timer:
             self.player.jump_ability = True  # Allow player to jump
             self.player.jump_boost = -1 * self.player.max_jump  # Setup jump
-            # self.player.jump_sound_1.play()  # Play jump sound
+            SFX_BANK.play("jump")  # Play jump sound
             self.player.jumps += 1  # Add to a jump counter
-            self.jump_timer = pygame.time.get_ticks()  # Reset jump timer
+            self.jump_timer = self.sim_time  # Reset jump timer
 
         # Held controls for left and right movement
         if held[pygame.K_a] and \
-                10 < pygame.time.get_ticks() - self.held_delay and \
+                10 < self.sim_time - self.held_delay and \
                 not self.player.disable_left and not self.player.freeze and \
                 self.player.alive:
-            move_left = self.player.smart_left(self.platforms)    # Collision Logic for platforms going left
+            move_left = self.player.smart_left(self.nearby(0))    # Collision Logic for platforms going left
             self.update_plat_x(move_left)    # Move every object left, depending on collision
             self.scene_bg.bg_pos_x(move_left)    # Move background left, at an altered rate
-            self.held_delay = pygame.time.get_ticks()
+            self.held_delay = self.sim_time
         if held[pygame.K_d] and \
-                10 < pygame.time.get_ticks() - self.held_delay and \
+                10 < self.sim_time - self.held_delay and \
                 not self.player.disable_right and not self.player.freeze and \
                 self.player.alive:
-            move_right = self.player.smart_right(self.platforms)    # Collision Logic for platforms going right
+            move_right = self.player.smart_right(self.nearby(0))    # Collision Logic for platforms going right
             self.update_plat_x(move_right)    # Move every object right, depending on collision
-            self.scene_bg.bg_pos_x(move_right)    Move background right, at an altered rate
-            self.held_delay = pygame.time.get_ticks()
+            self.scene_bg.bg_pos_x(move_right)    # Move background right, at an altered rate
+            self.held_delay = self.sim_time
 
     def update(self):
         # Failsafe if player isn't rendered but level starts
         if self.player.square_render is None:
             return None  # Player is not rendered, skip function
 
+        if self.region_streamer is not None:
+            self.stream_regions()    # Regions around the camera, read in the background
+
         grav_y = self.player.gravity()    # Calculate gravity (how many y down, positive)
         self.update_plat_y(grav_y)    # Apply some number of y from gravity
         self.scene_bg.bg_pos_y(grav_y)    # Apply some number of y, at an altered rate
@@ -771,20 +2300,21 @@ class PlayLevel(Scene):
         if self.player.alive and not self.player.freeze and \
                 not self.level_condition:
             # Check if player collided with death zones (returns 1 or 0)
-            if 0 < self.player.death(self.death_zones):
+            if 0 < self.player.death(self.nearby(2, self.player.square_render)):
                 self.deaths += 1
                 self.reload()    # Reload the current scene if player loses
+                return None    # The level was reset, carry on next step
             else:
-                self.player.collision_plat(
-                    self.platforms)  # Top and bottom coll
-                self.player.collision_wall(self.platforms)
+                near_plats = self.nearby(0)    # Only the platforms around the player
+                self.player.collision_plat(near_plats)  # Top and bottom coll
+                self.player.collision_wall(near_plats)
                 self.player.update_detection()  # Player movement
 
         """Respawn for square players, reset spawn position, set direction
         to right by default, reset gravity"""
         if not self.player.alive and not self.player.freeze and \
                 not self.level_condition:
-            self.jump_timer = pygame.time.get_ticks()  # Reset jump timer
+            self.jump_timer = self.sim_time  # Reset jump timer
             self.player.jump_boost = -1 * (self.player.max_jump - 1)
             self.player.jump_ability = False
 
@@ -794,85 +2324,230 @@ class PlayLevel(Scene):
             self.player.enable_gravity = False
             self.deaths += 1
             self.reload()
+            return None    # The level was reset, carry on next step
 
         # Check for win collision
+        player_rect = self.to_world(self.player.square_render)    # Player at its level position
+        near_wins = self.element_hash[1].query(player_rect)
         if self.player.alive and \
-                self.player.square_render.collidelist(self.win_zones) != -1:
+                player_rect.collidelist(near_wins) != -1:
             self.level_condition = True
             self.player.alive = False
-            next_index = self.player.square_render.collidelist(self.win_zones)
+            win_block = near_wins[player_rect.collidelist(near_wins)]
+            # Find the warp stored at the same index as the touched win zone
+            next_index = [id(each_rect) for each_rect in self.win_zones].index(id(win_block))
             self.next_level(self.memory_win_warp.loaded[next_index])
 
         # Respawn block collision
+        near_respawns = self.element_hash[3].query(player_rect)
         if self.player.alive and \
-                self.player.square_render.collidelist(self.respawn_zones) != -1:
+                player_rect.collidelist(near_respawns) != -1:
             # Setup respawn block for readability
-            respawn_block = self.player.square_render.collidelist(
-                self.respawn_zones)
+            respawn_block = near_respawns[player_rect.collidelist(
+                near_respawns)]
             # Set new x and y default spawns
-            self.x_spawn = self.respawn_zones[respawn_block].x + (
-                    self.respawn_zones[respawn_block].width / 2) - 5
-            self.y_spawn = self.respawn_zones[respawn_block].y + (
-                    self.respawn_zones[respawn_block].height / 2) - 5
+            self.x_spawn = respawn_block.x + (respawn_block.width / 2) - 5
+            self.y_spawn = respawn_block.y + (respawn_block.height / 2) - 5
 
     def next_level(self, lv_id):
-        # Go to the next level according to the set order in game data
-        all_levels = Memory()
-        all_levels.get_scene("game_files/game_data/")
+        # Go to the next level according to the set order in game data, using what was read ahead of time
+        next_id = int(self.all_levels[lv_id])
         self.change_scene(PlayLevel(self.x_spawn, self.y_spawn,
                                     self.res_width, self.res_height,
-                                    int(all_levels.loaded[lv_id])))
+                                    next_id, LEVEL_PREFETCHER.take(next_id), self.stream_radius))
+
+    def build_chunks(self):
+        # Put every static tile into a new chunk cache
+        self.chunk_cache = ChunkCache(512)
+        for each_id in self.element:
+            for obj_ind in range(len(self.element[each_id])):
+                if self.memory_asset_type.loaded[each_id][obj_ind] == 0:
+                    render_id = self.memory_asset_id.loaded[each_id][obj_ind]
+                    self.chunk_cache.add_tile(self.element[each_id][obj_ind], each_id,
+                                              self.memory_img.loaded[render_id].img)
+
+    def check_assets(self):
+        # Draw the chunks and the whole screen again if the registry reloaded assets since last frame
+        if self.asset_version != ASSET_REGISTRY.version:
+            self.asset_version = ASSET_REGISTRY.version
+            self.build_chunks()
+            self.last_frame_state = None
 
     def victory(self, screen):
         # Victory function played when win condition
         pass
 
     def render(self, screen):
-        # Default rendering
+        # Default rendering, returns the changed areas of the screen (None if all of it changed)
+        self.check_assets()
+        self.frame_now = pygame.time.get_ticks()
+        if self.full_render:
+            self.draw(screen)
+            return None
+        return self.render_changed(screen)
+
+    def draw(self, screen):
+        # Draw everything in the level
         self.render_bg(screen)
 
         self.render_level(screen)
         self.player.render(screen)
         self.render_text(screen)
 
+    def render_changed(self, screen):
+        """ Only draw over what changed since the last frame, and return those areas.
+        Moving, pausing or a new background frame redraws everything, otherwise only
+        animated elements that change frame are drawn again"""
+        frame_state = (self.camera_x, self.camera_y, tuple(self.player.square_render),
+                       self.player.freeze, self.level_condition,
+                       self.scene_bg.x_offset, self.scene_bg.y_offset)
+        if frame_state == self.last_frame_state and self.player.freeze:
+            return []    # Paused and nothing moved, the screen stays as it is
+        if frame_state != self.last_frame_state or self.scene_bg.due(self.frame_now):
+            self.last_frame_state = frame_state
+            self.draw(screen)
+            return None
+
+        changed = []
+        for plat, animation in self.visible_animated():
+            if animation.due(self.frame_now):
+                changed += [pygame.Rect(plat.x, plat.y, animation.img_width, animation.img_height)]
+        if 0 < len(changed):
+            # Draw the frame as usual, but only inside the changed areas
+            screen.set_clip(changed[0].unionall(changed[1:]))
+            self.draw(screen)
+            screen.set_clip(None)
+        return changed
+
     def update_plat_x(self, move_x):
         # Move the reference rect marker in the x-axis
         self.invis_rect.x += move_x
-        for plat in self.platforms + self.win_zones + \
-                    self.death_zones + self.respawn_zones + \
-                    self.decorations:
-            plat.x += move_x    # Apply horizontal movement to each platform
+        self.camera_x += int(move_x)    # Apply horizontal movement to every platform at once
 
     def update_plat_y(self, move_y):
         if move_y is not None:
             # Move the reference rect marker in the y-axis
             self.invis_rect.y += int(move_y)
-            for plat in self.platforms + self.win_zones + \
-                        self.death_zones + self.respawn_zones + \
-                        self.decorations:
-                plat.y += int(move_y)    # Apply vertical movement to each platform
+            self.camera_y += int(move_y)    # Apply vertical movement to every platform at once
+
+    def stream_regions(self, wait=False):
+        """ Add the regions read around the camera and remove the ones left far behind.
+        With wait, the regions around the camera are all read before this returns"""
+        loaded, dropped = self.region_streamer.update(
+            self.to_world(pygame.Rect(0, 0, self.res_width, self.res_height)), wait)
+        for region_key in dropped:
+            self.remove_region(region_key)
+        for region_key, saved in loaded:
+            self.add_region(region_key, saved)
+        if (loaded or dropped) and self.element_store is not None:
+            self.element_store.load_level(self.element, self.memory_asset_id.loaded,
+                                          self.memory_asset_type.loaded)
+
+    def add_region(self, region_key, saved):
+        # Add the elements of one region to the level, the same way they are set up when it loads
+        region_ids = set()
+        for each_id in self.element:
+            region_rects = saved[ELEMENT_SAVES[each_id]]
+            self.element[each_id] += region_rects
+            self.memory_asset_id.loaded[each_id] += saved["save_asset"][each_id]
+            self.memory_asset_type.loaded[each_id] += saved["save_asset_id"][each_id]
+            for obj_ind in range(len(region_rects)):
+                region_ids.add(id(region_rects[obj_ind]))
+                if each_id in self.element_hash:
+                    self.element_hash[each_id].insert(region_rects[obj_ind])
+                if saved["save_asset_id"][each_id][obj_ind] == 0:
+                    render_id = saved["save_asset"][each_id][obj_ind]
+                    self.chunk_cache.add_tile(region_rects[obj_ind], each_id,
+                                              self.memory_img.loaded[render_id].img)
+        self.memory_win_warp.loaded += saved["save_level"]
+        self.region_elements[region_key] = region_ids
+
+    def remove_region(self, region_key):
+        # Take the elements of one region out of the level, keeping the element lists lined up
+        region_ids = self.region_elements.pop(region_key)
+        for each_id in self.element:
+            keep = []
+            for obj_ind in range(len(self.element[each_id])):
+                each_rect = self.element[each_id][obj_ind]
+                if id(each_rect) in region_ids:
+                    if each_id in self.element_hash:
+                        self.element_hash[each_id].remove(each_rect)
+                    self.chunk_cache.remove_tile(each_rect)
+                else:
+                    keep += [obj_ind]
+            # Change the lists in place, other names refer to them (self.platforms and so on)
+            self.element[each_id][:] = [self.element[each_id][obj_ind] for obj_ind in keep]
+            self.memory_asset_id.loaded[each_id][:] = [self.memory_asset_id.loaded[each_id][obj_ind]
+                                                       for obj_ind in keep]
+            self.memory_asset_type.loaded[each_id][:] = [self.memory_asset_type.loaded[each_id][obj_ind]
+                                                         for obj_ind in keep]
+            if each_id == 1:
+                self.memory_win_warp.loaded[:] = [self.memory_win_warp.loaded[obj_ind] for obj_ind in keep]
+
+    def to_screen(self, rect):
+        # Move a rect from its level position to where it is on screen
+        return rect.move(self.camera_x, self.camera_y)
+
+    def to_world(self, rect):
+        # Move a rect on screen back to its level position
+        return rect.move(-1 * self.camera_x, -1 * self.camera_y)
+
+    def nearby(self, each_id, rect=None):
+        # Get the level elements of one type close to rect (the player's collision area by default),
+        # moved to where they are on screen
+        if rect is None:
+            rect = self.player.collide_rect
+        return [self.to_screen(each_rect) for each_rect in
+                self.element_hash[each_id].query(self.to_world(rect))]
 
     def render_level(self, screen):
         """ This function will be altered in the child class"""
+        # Static tiles are already drawn onto chunks, blit the ones on screen
+        self.chunk_cache.render(screen,
+                                self.to_world(pygame.Rect(0, 0, self.res_width, self.res_height)),
+                                self.camera_x, self.camera_y)
+
+        # Work out each animation's frame once, then every element using it blits that frame
+        visible = self.visible_animated()
+        for animation in {id(animation): animation for plat, animation in visible}.values():
+            animation.update_render(self.frame_now)
+        screen.blits([(animation.source, plat, animation.frame_areas[animation.img_index])
+                      for plat, animation in visible], False)
+
+    def visible_animated(self):
+        # Get the animated elements on screen as (screen rect, animation) pairs, in drawing order
+        visible = []
+        if self.element_store is not None:
+            # Found with array operations
+            store = self.element_store
+            rows = store.cull(self.to_world(pygame.Rect(0, 0, self.res_width, self.res_height)))
+            rows = rows[store.render_type[rows] != 0]    # Static ones are drawn with their chunk
+            for plat_x, plat_y, plat_width, plat_height, render_id in zip(
+                    (store.x[rows] + self.camera_x).tolist(),
+                    (store.y[rows] + self.camera_y).tolist(),
+                    store.width[rows].tolist(),
+                    store.height[rows].tolist(),
+                    store.asset_id[rows].tolist()):
+                visible += [(pygame.Rect(plat_x, plat_y, plat_width, plat_height),
+                             self.memory_ani.loaded[render_id])]
+            return visible
+
         for each_id in self.element:
             # Get index of each type of level object
             for obj_ind in range(len(self.element[each_id])):
-                # Refer to each object in each type individually
-                plat = self.element[each_id][obj_ind]
+                render_type = self.memory_asset_type.loaded[each_id][obj_ind]
+                if render_type == 0:
+                    continue    # Static, already drawn with its chunk
+                # Refer to each object in each type individually, where it is on screen
+                plat = self.to_screen(self.element[each_id][obj_ind])
                 # If the platform is within screen bounds, then render
-                if (0 <= plat.x + plat.width <= game_width or
-                    0 <= plat.x <= game_width) and \
-                        (0 <= plat.y + plat.height <= game_height or
-                         0 <= plat.y <= game_height):
+                if (0 <= plat.x + plat.width <= self.res_width or
+                    0 <= plat.x <= self.res_width) and \
+                        (0 <= plat.y + plat.height <= self.res_height or
+                         0 <= plat.y <= self.res_height):
                     render_id = self.memory_asset_id.loaded[each_id][obj_ind]
-                    render_type = self.memory_asset_type.loaded[each_id][
-                        obj_ind]
-                    # Check if the object is animated for altered rendering
-                    if render_type == 0:
-                        screen.blit(self.memory_img.loaded[render_id].img, plat)
-                    else:
-                        self.memory_ani.loaded[render_id].update_render()
-                        self.memory_ani.loaded[render_id].render(screen, plat)
+                    visible += [(plat, self.memory_ani.loaded[render_id])]
+        return visible
 
     def render_text(self, screen):
         """ Use this function to render important text for levels.
@@ -894,19 +2569,47 @@ class PlayLevel(Scene):
                         self.pause_text_5.text_rect)
 
     def render_bg(self, screen):
-        # Render the background as white by default, or animated if found
-        screen.fill(WHITE)
-        if 0 <= len(self.memory_bg_id.loaded):
-            self.scene_bg.update_render()
-            self.scene_bg.render(screen, (
-            (self.res_width - self.scene_bg.img_width) / 2,
-            (self.res_height - self.scene_bg.img_height) / 2))
+        # Render the animated background, over white where it doesn't cover the screen
+        self.scene_bg.update_render(self.frame_now)
+        bg_pos = ((self.res_width - self.scene_bg.img_width) / 2,
+                  (self.res_height - self.scene_bg.img_height) / 2)
+        if not self.scene_bg.covers(screen.get_rect(), bg_pos):
+            screen.fill(WHITE)
+        self.scene_bg.render(screen, bg_pos)
+
+    def snapshot(self):
+        # Copy the level state that changes while playing. Level elements never move, only the camera does
+        return {"sim_time": self.sim_time,
+                "camera_x": self.camera_x,
+                "camera_y": self.camera_y,
+                "invis_rect": self.invis_rect.copy(),
+                "deaths": self.deaths,
+                "play_time": self.play_time,
+                "level_condition": self.level_condition,
+                "jump_timer": self.jump_timer,
+                "held_delay": self.held_delay}
+
+    def restore(self, state):
+        # Put back state made by snapshot
+        for each_name in state:
+            if type(state[each_name]) is pygame.Rect:
+                setattr(self, each_name, state[each_name].copy())
+            else:
+                setattr(self, each_name, state[each_name])
+        self.last_frame_state = None    # Draw everything next frame
 
     def reload(self):
-        # Reset the current scene
-        self.change_scene(PlayLevel(self.x_spawn, self.y_spawn,
-                                    self.res_width, self.res_height,
-                                    self.level_id))
+        """ Reset the current scene to how it started, with the player at the
+        current spawn. Nothing is loaded again, so respawning is instant"""
+        self.restore(self.start_state)
+        self.invis_rect.center = (self.x_spawn, self.y_spawn)
+        self.player = Player(self.x_spawn, self.y_spawn,
+                             10, 10, PURPLE,
+                             self.res_width,
+                             self.res_height, 100)
+        self.scene_bg.reset_position()
+        if self.region_streamer is not None:
+            self.stream_regions(wait=True)    # The camera is back at the spawn
 
 
 class Player:
@@ -944,10 +2647,8 @@ class Player:
         self.speed = 4    # CHANGE: Player horizontal speed
 
         asset_path = "assets/"
-        # self.jump_sound_1 = pygame.mixer.Sound(sound_path + "jump_file")
-        # Jump sound for player
-        # self.jump_sound_1.set_volume(0.1 * (jump_vol / 100))  # out of 1 or 100%
-        # Jump volume for the player, set at 0.1 out of 1, or 10%
+        # Jump sound for player is "jump" in SFX_BANK, played by the level when jumping
+        # Its volume is set in the sound's file name (see SoundBank)
 
         # Get location and info of surrounding blocks
         self.size_factor = 5    # CHANGE: Increase to have better detection
@@ -1262,18 +2963,135 @@ class Player:
             return 0
 
 
+class HeldKeys:
+    """
+    Stand-in for pygame.key.get_pressed() when input comes from a script instead of the keyboard.
+        Indexing it with a key constant tells if that key is held down, like the real key state.
+    """
+
+    def __init__(self, keys=()):
+        self.keys = set(keys)    # Key constants currently held
+
+    def __getitem__(self, key):
+        return key in self.keys
+
+
+class ReplayRecorder:
+    """
+    Records the keys pressed and held on every fixed step into a compact binary stream.
+        Only the keys PlayLevel reacts to are kept (REPLAY_KEYS), as two bit masks per step.
+        Steps with the same masks in a row are stored once with a repeat count (run-length
+        encoding), so holding a key for a long time costs a few bytes. See ReplayPlayer for
+        reading the stream back.
+
+        Stream layout: header (REPLAY_HEADER: magic, version, tick rate, level id, width, height),
+        then records of held mask (2 bytes), pressed mask (2 bytes) and repeat count (varint).
+    """
+
+    def __init__(self, level_id, width, height, tick_rate):
+        self.data = bytearray(struct.pack(REPLAY_HEADER, b"PSCR", 1, tick_rate,
+                                          level_id, width, height))
+        self.last_masks = None    # (held mask, pressed mask) of the record not yet written
+        self.repeat = 0    # How many steps in a row used self.last_masks
+        self.steps = 0    # Total steps recorded
+
+    def record(self, pressed, held):
+        """ Add one step of input. pressed is a list of keys, held is indexable by key"""
+        held_mask = 0
+        pressed_mask = 0
+        for key_bit in range(len(REPLAY_KEYS)):
+            if held[REPLAY_KEYS[key_bit]]:
+                held_mask |= 1 << key_bit
+            if REPLAY_KEYS[key_bit] in pressed:
+                pressed_mask |= 1 << key_bit
+
+        if (held_mask, pressed_mask) == self.last_masks:
+            self.repeat += 1
+        else:
+            self.write_record(self.data)
+            self.last_masks = (held_mask, pressed_mask)
+            self.repeat = 1
+        self.steps += 1
+
+    def write_record(self, out_data):
+        # Write the pending masks and repeat count, with the count as a varint (7 bits per byte)
+        if self.last_masks is None:
+            return None
+        out_data += struct.pack("<HH", self.last_masks[0], self.last_masks[1])
+        repeat = self.repeat
+        while 0x80 <= repeat:
+            out_data.append((repeat & 0x7f) | 0x80)
+            repeat >>= 7
+        out_data.append(repeat)
+
+    def get_bytes(self):
+        # Everything recorded so far, including the record still being counted
+        out_data = bytearray(self.data)
+        self.write_record(out_data)
+        return bytes(out_data)
+
+    def save(self, out_path):
+        with open(out_path, "wb") as replay_file:
+            replay_file.write(self.get_bytes())
+
+
+class ReplayPlayer:
+    """
+    Reads a stream made by ReplayRecorder and gives back one (pressed, held) pair per step,
+        the same input Program passes to scene.input. Iterating it can feed Program.run at any
+        speed, or Program.run_headless to play it back as fast as possible.
+    """
+
+    def __init__(self, data):
+        self.data = bytes(data)
+        magic, version, self.tick_rate, self.level_id, self.width, self.height = \
+            struct.unpack_from(REPLAY_HEADER, self.data)
+        if magic != b"PSCR" or version != 1:
+            raise ValueError("Not a replay file, or made by another version")
+
+    def __iter__(self):
+        position = struct.calcsize(REPLAY_HEADER)
+        while position < len(self.data):
+            held_mask, pressed_mask = struct.unpack_from("<HH", self.data, position)
+            position += 4
+            repeat = 0
+            shift = 0
+            while True:
+                each_byte = self.data[position]
+                position += 1
+                repeat |= (each_byte & 0x7f) << shift
+                shift += 7
+                if each_byte < 0x80:
+                    break
+
+            # The same objects are handed out for every step of a repeated record
+            held = HeldKeys([REPLAY_KEYS[key_bit] for key_bit in range(len(REPLAY_KEYS))
+                             if held_mask & (1 << key_bit)])
+            pressed = [REPLAY_KEYS[key_bit] for key_bit in range(len(REPLAY_KEYS))
+                       if pressed_mask & (1 << key_bit)]
+            for _ in range(repeat):
+                yield pressed, held
+
+
 class Program:
     """
     Class responsible for how the game runs
     """
 
-    def __init__(self) -> None:
+    def __init__(self, tick_rate=120, max_steps=5, render_fps=120, dirty_rects=False, watch_every=0) -> None:
         self.running = True  # Determines if the game is running
-        # Initialize level/scene order from folders
-        self.levels = Memory()
-        self.levels.get_scene("game_files/game_data/")
-
-    def run(self, width, height, current_scene):
+        self.tick_rate = tick_rate  # Fixed input/update steps per second
+        self.step_ms = 1000 / tick_rate  # Length of one step in milliseconds
+        self.max_steps = max_steps  # Most steps run in one frame to catch up
+        self.render_fps = render_fps  # Frame cap for rendering, 0 for no cap
+        self.dirty_rects = dirty_rects  # Only update the parts of the display that changed
+        # Frames between checks of the asset folders for changed files, 0 to not check
+        ASSET_REGISTRY.watch_every = watch_every
+        # Initialize level/scene order from folders, only levels changed since last time are read
+        self.levels = LEVEL_INDEX
+        self.levels.refresh()
+
+    def run(self, width, height, current_scene, recorder=None, replay=None, replay_speed=1):
         """
         Where the actual game loop is running.
         Everything game related is defined in scene.
@@ -1292,16 +3110,42 @@ class Program:
         This is also where inputs are collected before they are sent to
         the inputs for scene.
 
+        Input and update run in fixed steps of self.step_ms. Time passed
+        since the last frame is added to an accumulator and spent one step
+        at a time, so physics stays the same whatever the render rate is.
+        If a frame takes too long, at most self.max_steps are run and the
+        rest of the time is dropped instead of stalling to catch up.
+
+        If recorder (a ReplayRecorder) is given, the input of every step is
+        recorded into it. If replay (a ReplayPlayer) is given, its input is
+        used instead of the keyboard, replay_speed times faster than normal,
+        and the game stops when the replay ends.
+
+        Assets changed on disk are reloaded here before the steps of a frame
+        if Program was made with watch_every (see AssetRegistry.poll).
+
         Finally, this is where FPS is set and where the display is updated.
+        With self.dirty_rects, scenes only draw what changed and only those
+        areas of the display are updated, so idle frames cost very little.
+        A frame where nothing changed sleeps until the next step is due
+        instead of looping again.
         """
         # self.memory.screen = pygame.display.set_mode([width, height])
         screen = pygame.display.set_mode([width, height])  # Set screen size
 
         scene = current_scene  # Set scene currently shown through a parameter
+        accumulator = 0  # Time waiting to be simulated, in milliseconds
+        keys_pressed = []  # Keys pressed/tapped (key press)
+        max_steps = self.max_steps * max(1, int(replay_speed))  # Faster replays need more steps
+        if replay is not None:
+            replay = iter(replay)
+        fps.tick()  # Start timing from here, not from when fps was made
         # Start game loop
         while self.running:
-            keys_pressed = []  # Keys pressed/tapped (key press)
+            accumulator += fps.tick(self.render_fps) * replay_speed  # Time since the last frame
+            ASSET_REGISTRY.poll()  # Pick up asset files changed on disk, if watching them
             keys_held = pygame.key.get_pressed()  # Keys held collected
+            changed = None  # Areas of the display to update, None for all of it
             for event in pygame.event.get():  # Collect all key presses
                 # Quit condition if you press the X on the top right
                 if event.type == pygame.QUIT:
@@ -1324,10 +3168,29 @@ class Program:
                 scene.close_game()  # Tell scene to shut off
             else:
                 # Functional game loop
-
-                scene.input(keys_pressed, keys_held)  # Call to use keys in
-                scene.update()  # Call to dynamically use/update/check changes
-                scene.render(screen)  # Visually render desired graphics
+                steps = 0
+                while self.step_ms <= accumulator and steps < max_steps:
+                    if replay is not None:
+                        # Take the input of this step from the replay instead
+                        replay_keys = next(replay, None)
+                        if replay_keys is None:
+                            self.running = False  # Replay is over
+                            break
+                        keys_pressed, keys_held = replay_keys
+                    if recorder is not None:
+                        recorder.record(keys_pressed, keys_held)
+                    scene.step_time(self.step_ms)  # Advance the scene clock
+                    scene.input(keys_pressed, keys_held)  # Call to use keys in
+                    keys_pressed = []  # Key presses only count for one step
+                    scene.update()  # Call to dynamically use/update/check changes
+                    scene = scene.this_scene  # Change scenes between steps
+                    accumulator -= self.step_ms
+                    steps += 1
+                if self.step_ms <= accumulator:
+                    accumulator = 0  # Too far behind, drop the time left over
+
+                scene.full_render = not self.dirty_rects
+                changed = scene.render(screen)  # Visually render desired graphics
                 scene = scene.this_scene
                 """This line is important to allow changing scenes (if
                 this_scene is different like using
@@ -1338,13 +3201,40 @@ class Program:
                 """if 0 != scene.level_id:
                     self.memory.music.transition_music()"""
 
-            fps.tick(120)  # 120 frames per second
-            pygame.display.update()  # Update the visual output dynamically
+            if self.dirty_rects and changed is not None:
+                pygame.display.update(changed)  # Only update the areas that changed
+                if len(changed) < 1:
+                    # Nothing to draw until the next step, so don't spin the CPU until then
+                    pygame.time.wait(max(0, int((self.step_ms - accumulator) / replay_speed)))
+            else:
+                pygame.display.update()  # Update the visual output dynamically
+
+    def run_headless(self, current_scene, input_stream):
+        """
+        Game loop without a window, rendering or frame limiter, used to
+        check levels and measure physics speed. Every (pressed, held) pair
+        in input_stream is one fixed step and steps run as fast as the CPU
+        allows. pressed is a list of keys for that step, and held is
+        anything indexable by key like HeldKeys. A ReplayPlayer can be
+        used as input_stream to play a replay back at full speed.
+
+        Returns the scene the stream ended on and the number of steps run.
+        """
+        scene = current_scene
+        steps = 0
+        for keys_pressed, keys_held in input_stream:
+            if scene is None or not scene.run_scene:
+                break
+            scene.step_time(self.step_ms)  # Advance the scene clock
+            scene.input(keys_pressed, keys_held)
+            scene.update()
+            scene = scene.this_scene
+            steps += 1
+        return scene, steps
 
 
 if __name__ == "__main__":
     pygame.init()  # Initialize pygame
-    pygame.mixer.init()  # Initialize pygame's sound
 
     fps = pygame.time.Clock()  # Initialize the frame rate
 
@@ -1352,6 +3242,83 @@ if __name__ == "__main__":
     game_width = 1080
     game_height = 576
 
+    def command_option(name, default):
+        # Value given after an option on the command line, or default if it's missing
+        if name in sys.argv and sys.argv.index(name) + 1 < len(sys.argv):
+            return sys.argv[sys.argv.index(name) + 1]
+        return default
+
+    replay_path = command_option("--replay", None)    # Replay file to play back
+    record_path = command_option("--record", None)    # Replay file to record into
+
+    if "--build-atlas" in sys.argv:
+        """Pack the tile images and animations into game_files/psC_atlas:
+        python psC_main.py --build-atlas. Run it again after changing assets"""
+        game_atlas = TextureAtlas()
+        game_atlas.pack(["game_files/psC_imgs", "game_files/psC_ani"])
+        game_atlas.save("game_files/psC_atlas")
+        print(str(len(game_atlas.entries)) + " files packed into " +
+              str(len(game_atlas.pages)) + " atlas pages")
+        pygame.quit()
+        sys.exit()
+
+    if "--convert-levels" in sys.argv:
+        """Make the binary level file of every level from its pickle files:
+        python psC_main.py --convert-levels"""
+        for level_name in os.listdir("game_files/game_data"):
+            LevelFile.convert("game_files/game_data/" + level_name + "/")
+            print(level_name + " converted to " + LEVEL_FILE)
+        pygame.quit()
+        sys.exit()
+
+    if "--split-regions" in sys.argv:
+        """Split every level into regions, so they are streamed around the camera:
+        python psC_main.py --split-regions [region size]"""
+        for level_name in os.listdir("game_files/game_data"):
+            LevelFile.split_regions("game_files/game_data/" + level_name + "/",
+                                    int(command_option("--split-regions", 2048)))
+            print(level_name + " split into regions")
+        pygame.quit()
+        sys.exit()
+
+    if "--headless" in sys.argv and replay_path is not None:
+        """Play a replay without a window, as fast as possible:
+        python psC_main.py --headless --replay file"""
+        with open(replay_path, "rb") as replay_file:
+            replay = ReplayPlayer(replay_file.read())
+        start_game = Program(replay.tick_rate)
+        start_scene = PlayLevel(replay.width / 2, replay.height / 2,
+                                replay.width, replay.height, replay.level_id)
+        start_time = pygame.time.get_ticks()
+        end_scene, steps_run = start_game.run_headless(start_scene, replay)
+        run_time = max(pygame.time.get_ticks() - start_time, 1)
+        print(replay_path + ": " + str(steps_run) + " steps in " + str(run_time) + " ms (" +
+              str(int(steps_run * start_game.step_ms / run_time)) + "x real time)")
+        pygame.quit()
+        sys.exit()
+
+    if "--headless" in sys.argv:
+        """Run every level without a window: python psC_main.py --headless [steps]
+        The player starts each level with a jump and then stands still. Useful to
+        check that levels load and step without errors, and to time the physics."""
+        headless_steps = int(command_option("--headless", 10000))
+        start_game = Program()
+        for each_level in start_game.levels.ids:
+            start_scene = PlayLevel(game_width / 2, game_height / 2,
+                                    game_width, game_height, each_level)
+            script = [([pygame.K_SPACE], HeldKeys())] + \
+                [([], HeldKeys())] * (headless_steps - 1)
+            start_time = pygame.time.get_ticks()
+            end_scene, steps_run = start_game.run_headless(start_scene, script)
+            run_time = max(pygame.time.get_ticks() - start_time, 1)
+            print("lv_" + str(each_level) + ": " + str(steps_run) + " steps in " +
+                  str(run_time) + " ms (" + str(int(steps_run * 1000 / run_time)) +
+                  " steps per second)")
+        pygame.quit()
+        sys.exit()
+
+    pygame.mixer.init()  # Initialize pygame's sound
+
     pygame.display.set_mode([game_width, game_height])
 
     file_path = "put_icon_file_path_here"
@@ -1362,15 +3329,47 @@ if __name__ == "__main__":
     # scaling image correctly
     pygame.display.set_icon(icon) # game window icon"""
 
-    start_game = Program()  # Initialize running the game with Program
-    start_scene = PlayLevel(game_width / 2,
-                            game_height / 2,
-                            game_width, game_height,
-                            start_game.levels.loaded[0])
-    # Initialize the first scene/starting scene shown to the player
-    start_game.run(game_width, game_height, start_scene)  # Run the game loop
+    start_game = Program(dirty_rects="--dirty-rects" in sys.argv,
+                         watch_every=int(command_option("--watch-assets", 30))
+                         if "--watch-assets" in sys.argv else 0)
+    # Initialize running the game with Program, optionally only updating changed areas (--dirty-rects)
+    # and reloading asset files when they change (--watch-assets [frames between checks])
+
+    def first_scene():
+        # Initialize the first scene/starting scene shown to the player
+        return PlayLevel(game_width / 2,
+                         game_height / 2,
+                         game_width, game_height,
+                         start_game.levels[0])
+    # Shown after a loading screen, while the assets are decoded on worker threads
+    start_scene = LoadingScene(game_width, game_height, first_scene)
+
+    replay = None
+    if replay_path is not None:
+        """Watch a replay: python psC_main.py --replay file [--speed x]"""
+        with open(replay_path, "rb") as replay_file:
+            replay = ReplayPlayer(replay_file.read())
+        game_width, game_height = replay.width, replay.height  # Same screen as the recording
+        start_game = Program(replay.tick_rate, dirty_rects=start_game.dirty_rects,
+                             watch_every=ASSET_REGISTRY.watch_every)
+        start_scene = PlayLevel(game_width / 2, game_height / 2,
+                                game_width, game_height, replay.level_id)
+
+    recorder = None
+    if record_path is not None:
+        """Record a replay while playing: python psC_main.py --record file"""
+        if replay is None:
+            start_scene = first_scene()  # Recordings start on the level, not the loading screen
+        recorder = ReplayRecorder(start_scene.level_id, game_width, game_height,
+                                  start_game.tick_rate)
+
+    start_game.run(game_width, game_height, start_scene, recorder, replay,
+                   float(command_option("--speed", 1)))  # Run the game loop
     """The game loop will be stuck at this line (start_game.run) until the
     while loop (while self.running:) is no longer true. When self.running is
     False, the program will move onto the next line to quit"""
 
+    if recorder is not None:
+        recorder.save(record_path)  # Write the replay once the game is closed
+
     pygame.quit()  # Quit the game/pygame instance